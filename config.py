@@ -10,7 +10,78 @@ CHECK_INTERVAL_MINUTES = 30
 MAX_RETRIES = 3
 REQUEST_DELAY_SECONDS = 2
 
+# Profile health
+# A failing profile is skipped for PROFILE_BACKOFF_BASE_MINUTES, doubling with
+# each consecutive failure up to PROFILE_BACKOFF_MAX_MINUTES. Profiles that are
+# gone (not found) are deactivated after PROFILE_FAILURE_THRESHOLD failures.
+PROFILE_FAILURE_THRESHOLD = 5
+PROFILE_BACKOFF_BASE_MINUTES = 30
+PROFILE_BACKOFF_MAX_MINUTES = 24 * 60
+
+# HTTP transport (shared by the API scraper and image downloads)
+# HTTP_POOL_MAXSIZE is the number of keep-alive connections kept per host;
+# HTTP_POOL_MAXSIZE_PER_HOST overrides it for specific hosts.
+HTTP_POOL_CONNECTIONS = 10
+HTTP_POOL_MAXSIZE = 10
+HTTP_POOL_MAXSIZE_PER_HOST = {}
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_READ_TIMEOUT = 30
+DNS_CACHE_TTL_SECONDS = 300
+
+# Watch rules
+# Matches are always queued in the watch_matches table; set a path to also
+# append them to a JSONL outbox file.
+WATCH_OUTBOX_FILE = None
+
+# Image processing
+# Downloaded images are capped at IMAGE_MAX_DIMENSION pixels; each entry in
+# IMAGE_DERIVATIVE_SIZES produces an extra "<name>" copy fitting that size,
+# for images larger than it.
+IMAGE_MAX_DIMENSION = 2000
+IMAGE_DERIVATIVE_SIZES = {
+    'preview': 800,
+    'thumb': 200,
+}
+
+# Retention (None disables the limit)
+# Files not used for RETENTION_DAYS are removed, then the least recently used
+# files are evicted until downloads fit in DISK_QUOTA_MB.
+RETENTION_DAYS = None
+DISK_QUOTA_MB = None
+
+# Logging
+# Console progress lines are printed at most once per PROGRESS_INTERVAL_SECONDS;
+# scraping log rows are written to the database in batches of LOG_BATCH_SIZE.
+PROGRESS_INTERVAL_SECONDS = 1.0
+LOG_BATCH_SIZE = 100
+
+# Post metadata is appended to one posts.jsonl per profile and synced to disk
+# once per batch of METADATA_BATCH_SIZE posts (and at the end of each profile).
+METADATA_BATCH_SIZE = 50
+
+# Memory watchdog (automatic mode)
+# The monitor restarts itself after a cycle that leaves RSS above
+# MEMORY_RSS_LIMIT_MB (None disables). MEMORY_TRACEMALLOC_FRAMES > 0 enables
+# allocation tracing, logging the MEMORY_REPORT_TOP biggest growers per cycle.
+MEMORY_RSS_LIMIT_MB = None
+MEMORY_TRACEMALLOC_FRAMES = 0
+MEMORY_REPORT_TOP = 10
+
 # File paths
 DOWNLOADS_FOLDER = "data/downloads"
 DATABASE_PATH = "data/database.db"
 LOGS_FOLDER = "logs"
+
+# Storage for downloaded images and metadata: 'local' keeps files under
+# DOWNLOADS_FOLDER; 's3' uses an S3-compatible bucket (requires boto3).
+# Set S3_ENDPOINT_URL for MinIO or other non-AWS services, e.g.
+# "http://localhost:9000". Credentials come from the usual AWS environment
+# variables or config files.
+STORAGE_BACKEND = 'local'
+S3_BUCKET = None
+S3_PREFIX = ''
+S3_ENDPOINT_URL = None
+S3_REGION = None
+S3_MULTIPART_CHUNK_MB = 8
+# Existence checks and listings sent to S3 at the same time
+S3_MAX_CONCURRENT_REQUESTS = 16
@@ -4,13 +4,14 @@ Tise.com Profile Scraper
 Main application entry point for monitoring Tise profiles and downloading new posts.
 """
 
+import os
 import sys
 import time
 import signal
 import logging
 import schedule
 from datetime import datetime
-from typing import List
+from typing import List, Dict, Optional
 
 sys.path.append('src')
 
@@ -20,38 +21,42 @@ from config import (
     REQUEST_DELAY_SECONDS,
     DOWNLOADS_FOLDER, 
     DATABASE_PATH, 
-    LOGS_FOLDER
+    LOGS_FOLDER,
+    RETENTION_DAYS,
+    DISK_QUOTA_MB
 )
 from database import DatabaseManager
-from scraper_new import TiseScraper
+from scraper_new import TiseScraper, ScrapeError
 from downloader import FileDownloader
+from exporter import PostExporter
+from image_index import NearDuplicateIndex, MAX_DISTANCE
+from log_utils import setup_logging, progress, log_event
+from transport import get_shared_transport, set_shared_transport
+from profiles import parse_profile, read_profiles
+from memory_watch import MemoryWatchdog
+from cassette import RecordingTransport, ReplayTransport
 
 class TiseMonitor:
     """Main application class for monitoring Tise profiles."""
     
     def __init__(self):
         self.db = DatabaseManager()
-        self.scraper = TiseScraper()
-        self.downloader = FileDownloader()
+        self.transport = get_shared_transport()
+        self.scraper = TiseScraper(self.transport)
+        self.downloader = FileDownloader(self.transport)
+        self.duplicate_index = NearDuplicateIndex(self.db, self.downloader.storage)
         self.running = True
+        self.restart_requested = False
+        self.memory_watchdog = MemoryWatchdog()
         self._setup_logging()
         self._setup_signal_handlers()
         
     def _setup_logging(self):
         """Setup logging configuration."""
-        import os
         os.makedirs(LOGS_FOLDER, exist_ok=True)
         
         log_filename = f"{LOGS_FOLDER}/tise_scraper_{datetime.now().strftime('%Y%m%d')}.log"
-        
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_filename, encoding='utf-8'),
-                logging.StreamHandler(sys.stdout)
-            ]
-        )
+        self.log_listener = setup_logging(log_filename)
         
         logging.info("=== Tise Monitor Started ===")
     
@@ -71,15 +76,27 @@ class TiseMonitor:
             logging.warning("No profiles configured in PROFILES_TO_MONITOR")
             return
         
-        print(f"📋 Initializing {len(PROFILES_TO_MONITOR)} profiles...")
-        
-        for profile_url in PROFILES_TO_MONITOR:
-            profile_url = profile_url.strip()
-            if profile_url:
-                username = profile_url.rstrip('/').split('/')[-1]
-                self.db.add_profile(profile_url)
-                print(f"  ✅ Added profile: {username}")
-                logging.info(f"Added profile to monitor: {profile_url}")
+        profiles, _ = read_profiles(PROFILES_TO_MONITOR)
+        added = self.db.add_profiles_bulk(profiles)
+        if added:
+            print(f"📋 Added {added} of {len(profiles)} configured profiles")
+            logging.info(f"Added {added} profiles from config")
+    
+    def import_profiles(self, source: str):
+        """Bulk import profiles from a file, or stdin when `source` is '-'."""
+        try:
+            if source == '-':
+                profiles, rejected = read_profiles(sys.stdin)
+            else:
+                with open(source, encoding='utf-8') as f:
+                    profiles, rejected = read_profiles(f)
+            
+            added = self.db.add_profiles_bulk(profiles)
+            print(f"📋 Imported {added} new profiles ({len(profiles) - added} already monitored, {rejected} invalid)")
+            logging.info(f"Imported {added} profiles from {source}")
+        except Exception as e:
+            print(f"❌ Import failed: {e}")
+            logging.error(f"Error importing profiles from {source}: {e}")
     
     def check_all_profiles(self):
         """Check all active profiles for new posts."""
@@ -95,53 +112,71 @@ class TiseMonitor:
             
             total_new_posts = 0
             
-            for profile in profiles:
+            for index, profile in enumerate(profiles, 1):
                 try:
                     profile_url = profile['profile_url']
                     username = profile_url.rstrip('/').split('/')[-1]
-                    print(f"👤 Checking profile: {username}")
-                    logging.info(f"Checking profile: {profile_url}")
+                    progress.update(f"👤 Checking profile {index}/{len(profiles)}: {username}")
                     
                     # Check for new posts
                     new_posts = self.scraper.check_for_new_posts(profile_url)
                     
                     if new_posts:
-                        print(f"🆕 Found {len(new_posts)} new posts from {username}")
-                        logging.info(f"Found {len(new_posts)} new posts from {profile_url}")
+                        progress.done(f"🆕 Found {len(new_posts)} new posts from {username}")
                         
                         # Download content for new posts
+                        downloaded_posts = 0
                         for i, post in enumerate(new_posts, 1):
                             try:
                                 post_title = post['title'][:30] + "..." if len(post['title']) > 30 else post['title']
-                                print(f"  📝 Post {i}/{len(new_posts)}: {post_title}")
+                                progress.update(f"  📝 Post {i}/{len(new_posts)}: {post_title}")
                                 
                                 downloaded_files = self.downloader.download_post_content(post)
-                                if downloaded_files:
-                                    print(f"    ✅ Downloaded {len(downloaded_files)} files")
-                                    logging.info(f"Downloaded {len(downloaded_files)} files for: {post['title']}")
+                                if downloaded_files is not None:
+                                    downloaded_posts += 1
+                                    log_event('post_downloaded', f"Downloaded {len(downloaded_files)} images for: {post['title']}",
+                                              profile_url=profile_url, post_url=post['post_url'], files=len(downloaded_files))
                                 else:
-                                    print(f"    ❌ Failed to download files")
-                                    logging.warning(f"Failed to download content for: {post['title']}")
+                                    log_event('download_failed', f"Failed to download content for: {post['title']}",
+                                              level=logging.WARNING, profile_url=profile_url, post_url=post['post_url'])
                             except Exception as e:
-                                print(f"    ❌ Error downloading post")
                                 logging.error(f"Error downloading post {post['post_url']}: {e}")
-                    else:
-                        print(f"  ✓ No new posts found")
+                        
+                        self.downloader.flush_metadata()
+                        progress.done(f"    ✅ Downloaded {downloaded_posts}/{len(new_posts)} posts")
                     
                     total_new_posts += len(new_posts)
+                    log_event('profile_checked', f"Checked {profile_url}: {len(new_posts)} new posts",
+                              profile_url=profile_url, new_posts=len(new_posts))
+                    self.db.log_scraping_action(profile_url, 'check', 'success', f"{len(new_posts)} new posts")
                     
                     # Add delay between profiles
-                    time.sleep(REQUEST_DELAY_SECONDS)
+                    if self.transport.politeness_delay:
+                        time.sleep(REQUEST_DELAY_SECONDS)
+                    
+                except ScrapeError as e:
+                    progress.done(f"  ❌ Could not check {username}")
+                    log_event('profile_failed', str(e), level=logging.WARNING, profile_url=profile_url)
+                    self.db.log_scraping_action(profile_url, 'check', 'error', str(e))
+                    if self.transport.politeness_delay:
+                        time.sleep(REQUEST_DELAY_SECONDS)
                     
                 except Exception as e:
                     print(f"  ❌ Error checking profile")
                     logging.error(f"Error checking profile {profile.get('profile_url', 'unknown')}: {e}")
+                    self.db.log_scraping_action(profile.get('profile_url', 'unknown'), 'check', 'error', str(e))
             
             if total_new_posts > 0:
                 print(f"🎉 Check completed! Found {total_new_posts} new posts total")
             else:
                 print("✅ Check completed - no new posts found")
             logging.info(f"Profile check cycle completed. Found {total_new_posts} new posts total.")
+            self.db.flush_logs()
+            self.transport.log_stats()
+            
+            if RETENTION_DAYS is not None or DISK_QUOTA_MB is not None:
+                self.downloader.enforce_retention(max_age_days=RETENTION_DAYS, quota_mb=DISK_QUOTA_MB)
+            self.duplicate_index.backfill()
             
         except Exception as e:
             print("❌ Error during profile check")
@@ -160,10 +195,13 @@ class TiseMonitor:
             print(f"Total Posts Found: {db_stats.get('total_posts', 0)}")
             print(f"Downloaded Posts: {db_stats.get('downloaded_posts', 0)}")
             print(f"Recent Posts (24h): {db_stats.get('recent_posts', 0)}")
+            print(f"Recent Errors (24h): {db_stats.get('recent_errors', 0)}")
             print(f"Download Success Rate: {db_stats.get('download_percentage', 0):.1f}%")
             print(f"Total Files Downloaded: {download_stats.get('total_files', 0)}")
             print(f"Total Download Size: {download_stats.get('total_size_mb', 0):.1f} MB")
-            print(f"Downloads Folder: {download_stats.get('downloads_folder', 'N/A')}")
+            print(f"Storage: {download_stats.get('downloads_folder', 'N/A')}")
+            for host, host_stats in self.transport.connection_stats().items():
+                print(f"HTTP {host}: {host_stats['requests']} requests, {host_stats['reused']} reused connections")
             print("="*50 + "\\n")
             
         except Exception as e:
@@ -206,9 +244,10 @@ class TiseMonitor:
     def _add_profile_interactive(self):
         """Add profile interactively."""
         try:
-            profile_url = input("Enter Tise profile URL: ").strip()
-            if profile_url:
-                if self.db.add_profile(profile_url):
+            profile = parse_profile(input("Enter Tise profile URL: "))
+            if profile:
+                profile_url, username = profile
+                if self.db.add_profile(profile_url, username):
                     print(f"✓ Added profile: {profile_url}")
                     logging.info(f"Added profile interactively: {profile_url}")
                 else:
@@ -225,11 +264,13 @@ class TiseMonitor:
             print(f"⏰ Check interval: {CHECK_INTERVAL_MINUTES} minutes")
             print("⚡ Press Ctrl+C to stop\\n")
             
+            self.memory_watchdog.start()
+            
             # Schedule the monitoring job
-            schedule.every(CHECK_INTERVAL_MINUTES).minutes.do(self.check_all_profiles)
+            schedule.every(CHECK_INTERVAL_MINUTES).minutes.do(self._run_monitoring_cycle)
             
             # Run initial check
-            self.check_all_profiles()
+            self._run_monitoring_cycle()
             
             # Show when next check will happen (only once after initial check)
             next_run = schedule.next_run()
@@ -257,16 +298,300 @@ class TiseMonitor:
             print("❌ Error in automatic mode")
             logging.error(f"Error in automatic mode: {e}")
     
+    def _run_monitoring_cycle(self):
+        """Check all profiles, then stop for a restart if memory is over the limit."""
+        self.check_all_profiles()
+        if self.memory_watchdog.sample_cycle()['restart']:
+            print("♻️  Memory limit exceeded, restarting...")
+            logging.warning("Memory limit exceeded, restarting monitor")
+            self.restart_requested = True
+            self.running = False
+    
+    def export_posts(self, output_path: str, options: Dict[str, str]):
+        """Export posts to a JSONL, CSV or Parquet file."""
+        try:
+            exporter = PostExporter(self.db)
+            count = exporter.export(
+                output_path,
+                export_format=options.get('format'),
+                profile=options.get('profile'),
+                since=options.get('since'),
+                until=options.get('until'),
+                sold=_parse_flag(options.get('sold')),
+                downloaded=_parse_flag(options.get('downloaded')),
+            )
+            print(f"📦 Exported {count} posts to {output_path}")
+        except Exception as e:
+            print(f"❌ Export failed: {e}")
+            logging.error(f"Error exporting posts: {e}")
+    
+    def search_posts(self, query: str, options: Dict[str, str]):
+        """Print posts matching a keyword query."""
+        try:
+            results = self.db.search_posts(
+                query,
+                profile=options.get('profile'),
+                min_price=int(options['min-price']) if 'min-price' in options else None,
+                max_price=int(options['max-price']) if 'max-price' in options else None,
+                limit=int(options.get('limit', 20)),
+            )
+            if not results:
+                print(f"🔎 No posts found for '{query}'")
+                return
+            
+            print(f"🔎 {len(results)} posts matching '{query}':")
+            for post in results:
+                username = post['profile_url'].rstrip('/').split('/')[-1]
+                sold = " (sold)" if post['is_sold'] else ""
+                print(f"  • {post['title']} - {post['price']}{sold} [{username}]")
+                print(f"    {post['post_url']}")
+        except Exception as e:
+            print(f"❌ Search failed: {e}")
+            logging.error(f"Error searching posts: {e}")
+    
+    def find_duplicates(self, target: str, options: Dict[str, str]):
+        """Print images similar to a post URL, a stored image or a local image file."""
+        try:
+            max_distance = int(options.get('max-distance', 6))
+            if not 0 <= max_distance <= MAX_DISTANCE:
+                max_distance = min(max(max_distance, 0), MAX_DISTANCE)
+                print(f"⚠️  --max-distance limited to {max_distance} (allowed: 0-{MAX_DISTANCE})")
+            
+            if target.startswith('http'):
+                matches = self.duplicate_index.find_similar_to_post(target, max_distance)
+            else:
+                matches = self.duplicate_index.find_similar_to_image(target, max_distance)
+            
+            if not matches:
+                print(f"🖼️  No near-duplicates found for {target}")
+                return
+            
+            print(f"🖼️  {len(matches)} near-duplicate images for {target}:")
+            for match in matches:
+                print(f"  • distance {match['distance']:2d}: {match['file_path']}")
+                print(f"    {match['post_url']}")
+        except Exception as e:
+            print(f"❌ Duplicate search failed: {e}")
+            logging.error(f"Error finding duplicates: {e}")
+    
+    def run_retention(self, options: Dict[str, str]):
+        """Hash images missing a perceptual hash, then evict stored files by age and/or disk quota."""
+        try:
+            hashed = self.duplicate_index.backfill()
+            if hashed:
+                print(f"🖼️  Hashed {hashed} older images for duplicate search")
+            max_age_days = int(options['days']) if 'days' in options else RETENTION_DAYS
+            quota_mb = float(options['quota-mb']) if 'quota-mb' in options else DISK_QUOTA_MB
+            if max_age_days is None and quota_mb is None:
+                print("⚠️  No retention limits set (use --days or --quota-mb, or configure RETENTION_DAYS/DISK_QUOTA_MB)")
+                return
+            
+            result = self.downloader.enforce_retention(max_age_days=max_age_days, quota_mb=quota_mb)
+            print(f"🧹 Removed {result['removed_files']} files "
+                  f"({result['removed_bytes'] / (1024 * 1024):.1f} MB)")
+            if 'error' in result:
+                print(f"❌ Cleanup stopped early: {result['error']}")
+        except Exception as e:
+            print(f"❌ Cleanup failed: {e}")
+            logging.error(f"Error running retention: {e}")
+    
+    def print_profile_health(self):
+        """Print profiles that are backing off or deactivated."""
+        profiles = self.db.get_unhealthy_profiles()
+        if not profiles:
+            print("✅ All profiles are healthy")
+            return
+        
+        for profile in profiles:
+            username = profile['profile_url'].rstrip('/').split('/')[-1]
+            if not profile['active']:
+                print(f"  ⛔ {username}: deactivated ({profile['deactivated_reason']})")
+            else:
+                print(f"  ⏳ {username}: {profile['consecutive_failures']} failures, "
+                      f"next check after {profile['next_check_after'][:16]} ({profile['last_error']})")
+    
+    def reactivate_profiles(self, profile: Optional[str]):
+        """Re-enable one deactivated profile, or all when `profile` is 'all'."""
+        count = self.db.reactivate_profiles(None if profile == 'all' else profile)
+        print(f"✅ Reactivated {count} profile(s)")
+        logging.info(f"Reactivated {count} profile(s): {profile}")
+    
+    def add_watch_rule(self, name: str, options: Dict[str, str]):
+        """Add a watch rule from command line options."""
+        def split(value: Optional[str]) -> List[str]:
+            return [item.strip() for item in value.split(',') if item.strip()] if value else []
+        
+        min_price = int(options['min-price']) if 'min-price' in options else None
+        max_price = int(options['max-price']) if 'max-price' in options else None
+        if min_price is not None and max_price is not None and min_price > max_price:
+            print(f"❌ --min-price {min_price} is above --max-price {max_price}")
+            return
+        
+        rule_id = self.db.add_watch_rule(
+            name,
+            keywords=split(options.get('keywords')),
+            min_price=min_price,
+            max_price=max_price,
+            sizes=split(options.get('sizes')),
+            colors=split(options.get('colors')),
+        )
+        if rule_id:
+            print(f"🔔 Added watch rule #{rule_id}: {name}")
+        else:
+            print("❌ Could not add watch rule")
+    
+    def print_watch_rules(self):
+        """List active watch rules."""
+        rules = self.db.get_watch_rules()
+        if not rules:
+            print("🔔 No watch rules defined")
+            return
+        for rule in rules:
+            price = ""
+            if rule['min_price'] is not None or rule['max_price'] is not None:
+                price = f" price {rule['min_price'] or 0}-{rule['max_price'] if rule['max_price'] is not None else '∞'}"
+            print(f"  #{rule['id']} {rule['name']}: keywords {rule['keywords']}{price} "
+                  f"sizes {rule['sizes']} colors {rule['colors']}")
+    
+    def print_watch_matches(self, options: Dict[str, str]):
+        """Print undelivered watch matches and mark them delivered."""
+        matches = self.db.get_watch_matches(limit=int(options.get('limit', 100)))
+        if not matches:
+            print("🔔 No new watch matches")
+            return
+        for match in matches:
+            print(f"  🔔 [{match['rule_name']}] {match['title']} - {match['price']}")
+            print(f"    {match['post_url']}")
+        self.db.mark_watch_matches_delivered([match['id'] for match in matches])
+    
+    def print_trends(self, options: Dict[str, str]):
+        """Print posts found, downloads, bytes and errors per hour or day."""
+        period = options.get('period', 'day')
+        if period not in ('hour', 'day'):
+            print("✗ --period must be hour or day")
+            return
+        buckets = self.db.get_trends(options.get('profile'), period, int(options.get('limit', 14)))
+        if not buckets:
+            print("📈 No activity recorded yet")
+            return
+        print(f"📈 Activity per {period}" + (f" for {options['profile']}" if options.get('profile') else ""))
+        print(f"  {'Period':<16} {'Found':>7} {'Downloaded':>10} {'MB':>9} {'Errors':>7}")
+        for bucket in reversed(buckets):
+            label = bucket['bucket'].replace('T', ' ') + (':00' if period == 'hour' else '')
+            print(f"  {label:<16} {bucket['posts_found']:>7} {bucket['posts_downloaded']:>10} "
+                  f"{bucket['bytes_downloaded'] / (1024 * 1024):>9.1f} {bucket['errors']:>7}")
+    
     def cleanup(self):
         """Clean up resources."""
         try:
             self.scraper.close()
+            self.downloader.flush_metadata()
+            self.transport.close()
+            self.db.flush_logs()
             logging.info("=== Tise Monitor Stopped ===")
+            self.log_listener.stop()
         except Exception as e:
             logging.error(f"Error during cleanup: {e}")
 
+def _parse_options(args: List[str]) -> Dict[str, str]:
+    """Parse `--name value` pairs following a command."""
+    options = {}
+    i = 0
+    while i < len(args):
+        if args[i].startswith('--'):
+            name = args[i][2:]
+            if i + 1 < len(args) and not args[i + 1].startswith('--'):
+                options[name] = args[i + 1]
+                i += 1
+            else:
+                options[name] = 'yes'
+        i += 1
+    return options
+
+def _extract_traffic_options(args: List[str]) -> List[str]:
+    """Install a recording or replaying transport from --record/--replay and return the remaining arguments."""
+    remaining = []
+    record_path = replay_path = None
+    realistic_timing = False
+    i = 0
+    while i < len(args):
+        if args[i] == '--record' and i + 1 < len(args):
+            record_path = args[i + 1]
+            i += 1
+        elif args[i] == '--replay' and i + 1 < len(args):
+            replay_path = args[i + 1]
+            i += 1
+        elif args[i] == '--realistic-timing':
+            realistic_timing = True
+        else:
+            remaining.append(args[i])
+        i += 1
+    
+    if record_path and replay_path:
+        raise ValueError("--record and --replay cannot be combined")
+    if record_path:
+        set_shared_transport(RecordingTransport(record_path))
+    elif replay_path:
+        set_shared_transport(ReplayTransport(replay_path, realistic_timing=realistic_timing))
+    return remaining
+
+def _restart_command(args: List[str]) -> List[str]:
+    """Command line that restarts the monitor in automatic mode with the same --record/--replay options."""
+    command = [sys.executable, sys.argv[0]]
+    i = 0
+    while i < len(args):
+        if args[i] in ('--record', '--replay') and i + 1 < len(args):
+            command += args[i:i + 2]
+            i += 1
+        elif args[i] == '--realistic-timing':
+            command.append(args[i])
+        i += 1
+    return command + ['--auto']
+
+def _parse_flag(value: Optional[str]) -> Optional[bool]:
+    """Interpret a yes/no command line value, returning None when unset."""
+    if value is None:
+        return None
+    return value.strip().lower() in ('1', 'yes', 'true', 'y')
+
+def print_usage():
+    """Print command line usage."""
+    print("Usage: python main.py [--record CASSETTE | --replay CASSETTE [--realistic-timing]]")
+    print("                      [--auto|--check|--stats|--trends|--export FILE|--search QUERY|--duplicates TARGET|--cleanup|--health|--reactivate NAME|--import FILE|--add-rule NAME|--rules|--remove-rule ID|--matches]")
+    print("  --auto  : Run in automatic monitoring mode")
+    print("  --check : Check all profiles once and exit")
+    print("  --stats : Show statistics and exit")
+    print("  --trends [--period hour|day] [--profile NAME] [--limit N]")
+    print("          : Show posts found, downloaded, MB and errors per hour or day")
+    print("  --export FILE [--format jsonl|csv|parquet] [--profile NAME]")
+    print("           [--since DATE] [--until DATE] [--sold yes|no] [--downloaded yes|no]")
+    print("          : Stream posts to a JSONL, CSV or Parquet file and exit")
+    print("  --search QUERY [--profile NAME] [--min-price NOK] [--max-price NOK] [--limit N]")
+    print("          : Full-text search over post titles and descriptions")
+    print("  --duplicates POST_URL|IMAGE_FILE [--max-distance BITS]")
+    print("          : Find visually similar images across all profiles")
+    print("  --cleanup [--days N] [--quota-mb MB]")
+    print("          : Remove files unused for N days, then least recently used until under quota")
+    print("  --health : List profiles that are backing off after failures or deactivated")
+    print("  --reactivate NAME|all : Re-enable deactivated profiles")
+    print("  --import FILE|- : Bulk add profile URLs or usernames from a file or stdin")
+    print("  --add-rule NAME [--keywords a,b] [--min-price NOK] [--max-price NOK] [--sizes S,M] [--colors Black,Red]")
+    print("          : Alert on new posts matching all given criteria")
+    print("  --rules  : List watch rules")
+    print("  --remove-rule ID : Delete a watch rule")
+    print("  --matches [--limit N] : Show new watch rule matches and mark them delivered")
+    print("  --record CASSETTE : Save every API and image response to a cassette file")
+    print("  --replay CASSETTE : Serve responses from a cassette instead of tise.com,")
+    print("                      instantly or with --realistic-timing")
+
 def main():
     """Main entry point."""
+    try:
+        args = _extract_traffic_options(sys.argv[1:])
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}")
+        print_usage()
+        sys.exit(2)
     monitor = TiseMonitor()
     
     try:
@@ -274,19 +599,43 @@ def main():
         monitor.initialize_profiles()
         
         # Check command line arguments
-        if len(sys.argv) > 1:
-            if sys.argv[1] == '--auto':
+        if args:
+            if args[0] == '--auto':
                 monitor.run_automatic_mode()
-            elif sys.argv[1] == '--check':
+            elif args[0] == '--check':
                 monitor.check_all_profiles()
                 monitor.print_statistics()
-            elif sys.argv[1] == '--stats':
+            elif args[0] == '--stats':
                 monitor.print_statistics()
+            elif args[0] == '--trends':
+                monitor.print_trends(_parse_options(args[1:]))
+            elif args[0] == '--export' and len(args) > 1:
+                monitor.export_posts(args[1], _parse_options(args[2:]))
+            elif args[0] == '--search' and len(args) > 1:
+                monitor.search_posts(args[1], _parse_options(args[2:]))
+            elif args[0] == '--duplicates' and len(args) > 1:
+                monitor.find_duplicates(args[1], _parse_options(args[2:]))
+            elif args[0] == '--health':
+                monitor.print_profile_health()
+            elif args[0] == '--reactivate' and len(args) > 1:
+                monitor.reactivate_profiles(args[1])
+            elif args[0] == '--import' and len(args) > 1:
+                monitor.import_profiles(args[1])
+            elif args[0] == '--add-rule' and len(args) > 1:
+                monitor.add_watch_rule(args[1], _parse_options(args[2:]))
+            elif args[0] == '--rules':
+                monitor.print_watch_rules()
+            elif args[0] == '--remove-rule' and len(args) > 1:
+                if args[1].isdigit():
+                    print("✅ Rule removed" if monitor.db.remove_watch_rule(int(args[1])) else "✗ No such rule")
+                else:
+                    print(f"❌ Rule ID must be a number, got '{args[1]}' (see --rules)")
+            elif args[0] == '--matches':
+                monitor.print_watch_matches(_parse_options(args[1:]))
+            elif args[0] == '--cleanup':
+                monitor.run_retention(_parse_options(args[1:]))
             else:
-                print("Usage: python main.py [--auto|--check|--stats]")
-                print("  --auto  : Run in automatic monitoring mode")
-                print("  --check : Check all profiles once and exit")
-                print("  --stats : Show statistics and exit")
+                print_usage()
         else:
             # Run interactive mode
             monitor.run_interactive_mode()
@@ -295,6 +644,11 @@ def main():
         logging.error(f"Fatal error: {e}")
     finally:
         monitor.cleanup()
+    
+    if monitor.restart_requested:
+        # Replace this process with a fresh one; only automatic mode restarts,
+        # which may have been started from the interactive menu
+        os.execv(sys.executable, _restart_command(sys.argv[1:]))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,134 @@
+import gzip
+import json
+import time
+import base64
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+
+import requests
+
+from transport import HttpTransport
+
+# Response headers worth keeping; the rest only inflate the cassette
+RECORDED_HEADERS = ('content-type', 'content-encoding', 'content-length', 'etag', 'last-modified')
+
+class RecordingTransport(HttpTransport):
+    """HttpTransport that appends every response to a gzip-compressed JSONL cassette.
+
+    Each entry is written as its own gzip member and flushed straight away,
+    so a run that is killed keeps everything recorded up to that point.
+    """
+
+    def __init__(self, cassette_path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette_path = cassette_path
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._file = open(cassette_path, 'ab')
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None, stream: bool = False,
+            timeout=None) -> requests.Response:
+        """Send the request, read the whole body and record it."""
+        started = time.monotonic()
+        response = super().get(url, headers=headers, stream=stream, timeout=timeout)
+        body = response.content  # Cached on the response, so callers can still stream it
+        elapsed = time.monotonic() - started
+
+        entry = {
+            'method': 'GET',
+            'url': url,
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': {k: v for k, v in response.headers.items() if k.lower() in RECORDED_HEADERS},
+            'elapsed': round(elapsed, 4),
+            'body': base64.b64encode(body).decode('ascii'),
+        }
+        member = gzip.compress((json.dumps(entry) + '\n').encode('utf-8'))
+        with self._lock:
+            self._file.write(member)
+            self._file.flush()
+            self.recorded += 1
+        return response
+
+    def close(self):
+        """Finish the cassette and close pooled connections."""
+        with self._lock:
+            self._file.close()
+        logging.info(f"Recorded {self.recorded} responses to {self.cassette_path}")
+        super().close()
+
+class ReplayTransport:
+    """Serves responses from a cassette instead of the network.
+
+    Repeated requests for the same URL are answered in recorded order, with
+    the last recording reused once they run out. With `realistic_timing`
+    each response takes as long as it did when recorded; otherwise replies are
+    immediate and politeness delays are skipped.
+    """
+
+    def __init__(self, cassette_path: str, realistic_timing: bool = False):
+        self.cassette_path = cassette_path
+        self.realistic_timing = realistic_timing
+        self.politeness_delay = realistic_timing
+        self.dns_cache = None
+        self.served = defaultdict(int)
+        self.missing = defaultdict(int)
+        self._entries = defaultdict(list)
+        self._positions = defaultdict(int)
+        self._lock = threading.Lock()
+
+        count = 0
+        try:
+            with gzip.open(cassette_path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry['url']].append(entry)
+                        count += 1
+        except (EOFError, gzip.BadGzipFile, ValueError) as e:
+            # A recording killed mid-write leaves a partial last entry
+            logging.warning(f"Cassette {cassette_path} is truncated or corrupt after {count} entries: {e}")
+        if not count:
+            raise ValueError(f"Cassette {cassette_path} holds no recorded responses")
+        logging.info(f"Loaded {count} recorded responses for {len(self._entries)} URLs from {cassette_path}")
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None, stream: bool = False,
+            timeout=None) -> requests.Response:
+        """Return the recorded response for `url`."""
+        with self._lock:
+            entries = self._entries.get(url)
+            if not entries:
+                self.missing[url] += 1
+                raise requests.ConnectionError(f"No recorded response for {url}")
+            position = self._positions[url]
+            entry = entries[min(position, len(entries) - 1)]
+            self._positions[url] = position + 1
+            self.served[url] += 1
+
+        if self.realistic_timing:
+            time.sleep(entry['elapsed'])
+
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.reason = entry.get('reason', '')
+        response.headers.update(entry['headers'])
+        response.url = url
+        response._content = base64.b64decode(entry['body'])
+        response._content_consumed = True
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
+
+    def connection_stats(self) -> Dict[str, Dict[str, int]]:
+        """No network connections are made while replaying."""
+        return {}
+
+    def log_stats(self):
+        """Log how many requests were served from and missing in the cassette."""
+        logging.info(f"Replay: {sum(self.served.values())} responses served, "
+                     f"{sum(self.missing.values())} requests not in cassette")
+
+    def close(self):
+        """Log replay statistics."""
+        self.log_stats()
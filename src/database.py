@@ -1,17 +1,58 @@
 import sqlite3
 import os
+import atexit
 import logging
-from datetime import datetime
-from typing import List, Dict, Optional
-from config import DATABASE_PATH
+import threading
+import weakref
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Iterator
+from config import (
+    DATABASE_PATH,
+    LOG_BATCH_SIZE,
+    PROFILE_FAILURE_THRESHOLD,
+    PROFILE_BACKOFF_BASE_MINUTES,
+    PROFILE_BACKOFF_MAX_MINUTES,
+    IMAGE_DERIVATIVE_SIZES
+)
+from profiles import parse_profile
+
+# Rollup rows under this profile cover all profiles combined
+ALL_PROFILES = '*'
+
+# Rollup periods and the length of the ISO timestamp prefix naming their bucket
+STATS_PERIODS = {'hour': 13, 'day': 10, 'total': 0}
+
+# Perceptual hashes are indexed as four 16-bit bands (multi-index hashing)
+PHASH_BAND_BITS = 16
+PHASH_BANDS = [f"((phash >> {shift}) & 65535)" for shift in (0, 16, 32, 48)]
+
+_STATS_UPSERT = '''
+    ON CONFLICT (profile_url, period, bucket) DO UPDATE SET
+        posts_found = posts_found + excluded.posts_found,
+        posts_downloaded = posts_downloaded + excluded.posts_downloaded,
+        bytes_downloaded = bytes_downloaded + excluded.bytes_downloaded,
+        errors = errors + excluded.errors
+'''
+
+# Managers whose buffered log rows are written at exit, held weakly so the
+# exit hook does not keep them alive
+_log_buffer_owners = weakref.WeakSet()
+
+@atexit.register
+def _flush_all_logs():
+    for db in list(_log_buffer_owners):
+        db.flush_logs()
 
 class DatabaseManager:
     """Manages SQLite database operations for tracking scraped posts."""
     
     def __init__(self):
         self.db_path = DATABASE_PATH
+        self._log_buffer = []
+        self._log_lock = threading.Lock()
         self._ensure_db_directory()
         self._init_database()
+        _log_buffer_owners.add(self)
     
     def _ensure_db_directory(self):
         """Create database directory if it doesn't exist."""
@@ -35,7 +76,73 @@ class DatabaseManager:
                     post_date TEXT,
                     scraped_date TEXT NOT NULL,
                     downloaded BOOLEAN DEFAULT FALSE,
-                    file_paths TEXT  -- JSON string of downloaded file paths
+                    file_paths TEXT,  -- JSON string of downloaded file paths
+                    is_sold BOOLEAN DEFAULT FALSE,
+                    price_nok INTEGER  -- numeric price for range filters
+                )
+            ''')
+            added = self._ensure_columns(cursor, 'posts', {
+                'is_sold': 'BOOLEAN DEFAULT FALSE',
+                'price_nok': 'INTEGER',
+            })
+            if 'price_nok' in added:
+                # Backfill from the formatted "<amount> NOK" price text
+                cursor.execute('''
+                    UPDATE posts SET price_nok = CAST(price AS INTEGER)
+                    WHERE price LIKE '% NOK'
+                ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_posts_profile_scraped
+                ON posts (profile_url, scraped_date)
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_posts_scraped ON posts (scraped_date)')
+            self.fts_enabled = self._init_search_index(cursor)
+            
+            # Stored image files (originals and resized derivatives)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS post_files (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    post_url TEXT NOT NULL,
+                    source_url TEXT,
+                    variant TEXT NOT NULL,  -- 'original' or a derivative name
+                    file_path TEXT UNIQUE NOT NULL,
+                    width INTEGER,
+                    height INTEGER,
+                    size_bytes INTEGER,
+                    created_date TEXT NOT NULL,
+                    phash INTEGER,  -- 64-bit perceptual hash (originals only)
+                    phash_error TEXT,  -- why the image could not be hashed; not retried
+                    last_accessed TEXT  -- last time the post was downloaded or seen by a scrape
+                )
+            ''')
+            added = self._ensure_columns(cursor, 'post_files', {
+                'phash': 'INTEGER',
+                'phash_error': 'TEXT',
+                'last_accessed': 'TEXT',
+            })
+            if 'last_accessed' in added:
+                cursor.execute('UPDATE post_files SET last_accessed = created_date')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_post_files_post ON post_files (post_url)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_post_files_accessed ON post_files (last_accessed)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_post_files_source ON post_files (source_url)')
+            for band, expression in enumerate(PHASH_BANDS):
+                cursor.execute(f'''
+                    CREATE INDEX IF NOT EXISTS idx_post_files_phash_band{band}
+                    ON post_files ({expression}) WHERE phash IS NOT NULL
+                ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_post_files_missing_phash
+                ON post_files (variant) WHERE phash IS NULL
+            ''')
+            
+            # Where each post's metadata line lives in its profile's posts.jsonl
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS post_metadata (
+                    post_url TEXT PRIMARY KEY,
+                    file_path TEXT NOT NULL,
+                    byte_offset INTEGER NOT NULL,
+                    byte_length INTEGER NOT NULL,
+                    written_date TEXT NOT NULL
                 )
             ''')
             
@@ -47,9 +154,47 @@ class DatabaseManager:
                     username TEXT,
                     last_checked TEXT,
                     total_posts_found INTEGER DEFAULT 0,
-                    active BOOLEAN DEFAULT TRUE
+                    active BOOLEAN DEFAULT TRUE,
+                    consecutive_failures INTEGER DEFAULT 0,
+                    next_check_after TEXT,  -- skip the profile until this time
+                    last_error TEXT,
+                    deactivated_reason TEXT
                 )
             ''')
+            self._ensure_columns(cursor, 'profiles', {
+                'consecutive_failures': 'INTEGER DEFAULT 0',
+                'next_check_after': 'TEXT',
+                'last_error': 'TEXT',
+                'deactivated_reason': 'TEXT',
+            })
+            self._backfill_usernames(cursor)
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_profiles_username ON profiles (username)')
+            
+            # Watch rules and the outbox of posts matching them
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS watch_rules (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    keywords TEXT,  -- JSON list, any must appear in title/description
+                    min_price INTEGER,
+                    max_price INTEGER,
+                    sizes TEXT,  -- JSON list
+                    colors TEXT,  -- JSON list
+                    active BOOLEAN DEFAULT TRUE,
+                    created_date TEXT NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS watch_matches (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    rule_id INTEGER NOT NULL,
+                    post_url TEXT NOT NULL,
+                    matched_date TEXT NOT NULL,
+                    delivered BOOLEAN DEFAULT FALSE,
+                    UNIQUE (rule_id, post_url)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_watch_matches_delivered ON watch_matches (delivered)')
             
             # Scraping logs table
             cursor.execute('''
@@ -63,39 +208,294 @@ class DatabaseManager:
                 )
             ''')
             
+            # Per-profile hourly, daily and all-time counters
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats_rollup'")
+            rollup_exists = cursor.fetchone() is not None
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS stats_rollup (
+                    profile_url TEXT NOT NULL,  -- or '*' for all profiles
+                    period TEXT NOT NULL,  -- 'hour', 'day' or 'total'
+                    bucket TEXT NOT NULL,  -- local time prefix, e.g. '2024-05-01T13'; '' for totals
+                    posts_found INTEGER DEFAULT 0,
+                    posts_downloaded INTEGER DEFAULT 0,
+                    bytes_downloaded INTEGER DEFAULT 0,
+                    errors INTEGER DEFAULT 0,
+                    PRIMARY KEY (profile_url, period, bucket)
+                ) WITHOUT ROWID
+            ''')
+            if not rollup_exists:
+                self._backfill_stats_rollup(cursor)
+            
             conn.commit()
             logging.info("Database initialized successfully")
     
+    def _init_search_index(self, cursor) -> bool:
+        """Create the FTS5 index over post titles and descriptions.
+        
+        The index is an external-content table kept in sync with `posts` by
+        triggers. Returns False when SQLite was built without FTS5.
+        """
+        try:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'posts_fts'")
+            exists = cursor.fetchone() is not None
+            
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+                    title, description,
+                    content='posts', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN
+                    INSERT INTO posts_fts (rowid, title, description)
+                    VALUES (new.id, new.title, new.description);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN
+                    INSERT INTO posts_fts (posts_fts, rowid, title, description)
+                    VALUES ('delete', old.id, old.title, old.description);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF title, description ON posts BEGIN
+                    INSERT INTO posts_fts (posts_fts, rowid, title, description)
+                    VALUES ('delete', old.id, old.title, old.description);
+                    INSERT INTO posts_fts (rowid, title, description)
+                    VALUES (new.id, new.title, new.description);
+                END
+            ''')
+            
+            if not exists:
+                # Index posts stored before the search index existed
+                cursor.execute("INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')")
+            return True
+        except sqlite3.OperationalError as e:
+            logging.warning(f"Full-text search unavailable, falling back to LIKE queries: {e}")
+            return False
+    
+    def _backfill_stats_rollup(self, cursor):
+        """Fill the rollup table from posts, stored files and error logs.
+        
+        Download counts and bytes are bucketed by the time the post was
+        scraped, which is when it was downloaded in normal operation.
+        """
+        sources = [
+            ('posts_found, posts_downloaded', 'COUNT(*), COALESCE(SUM(downloaded), 0)',
+             'posts', 'TRUE', 'scraped_date', 'profile_url'),
+            ('bytes_downloaded', 'COALESCE(SUM(f.size_bytes), 0)',
+             'post_files f JOIN posts p ON p.post_url = f.post_url', 'TRUE', 'p.scraped_date', 'p.profile_url'),
+            ('errors', 'COUNT(*)',
+             'scraping_logs', "status = 'error' AND profile_url IS NOT NULL", 'timestamp', 'profile_url'),
+        ]
+        for columns, values, source, where, timestamp, profile_column in sources:
+            for scope in (profile_column, f"'{ALL_PROFILES}'"):
+                for period, length in STATS_PERIODS.items():
+                    cursor.execute(f'''
+                        INSERT INTO stats_rollup (profile_url, period, bucket, {columns})
+                        SELECT {scope}, ?, substr({timestamp}, 1, ?), {values}
+                        FROM {source} WHERE {where}
+                        GROUP BY 1, 3
+                    ''' + _STATS_UPSERT, (period, length))
+    
+    def _add_to_stats(self, cursor, profile_url: str, timestamp: Optional[str] = None,
+                      periods=tuple(STATS_PERIODS), posts_found: int = 0, posts_downloaded: int = 0,
+                      bytes_downloaded: int = 0, errors: int = 0):
+        """Add to the rollup counters of a profile and of all profiles, in the caller's transaction."""
+        timestamp = timestamp or datetime.now().isoformat()
+        rows = [
+            (scope, period, timestamp[:STATS_PERIODS[period]],
+             posts_found, posts_downloaded, bytes_downloaded, errors)
+            for scope in (profile_url, ALL_PROFILES)
+            for period in periods
+        ]
+        cursor.executemany('''
+            INSERT INTO stats_rollup
+            (profile_url, period, bucket, posts_found, posts_downloaded, bytes_downloaded, errors)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''' + _STATS_UPSERT, rows)
+    
+    def _backfill_usernames(self, cursor):
+        """Fill in usernames for profiles added before they were stored, lowercased like new ones."""
+        cursor.execute('SELECT id, profile_url FROM profiles WHERE username IS NULL')
+        rows = cursor.fetchall()
+        if rows:
+            cursor.executemany(
+                'UPDATE profiles SET username = ? WHERE id = ?',
+                [(profile_url.rstrip('/').split('/')[-1].lower(), profile_id) for profile_id, profile_url in rows]
+            )
+        cursor.execute('UPDATE profiles SET username = LOWER(username) WHERE username != LOWER(username)')
+    
+    def _ensure_columns(self, cursor, table: str, columns: Dict[str, str]) -> List[str]:
+        """Add columns missing from tables created by older versions and return their names."""
+        cursor.execute(f'PRAGMA table_info({table})')
+        existing = {row[1] for row in cursor.fetchall()}
+        added = []
+        for name, definition in columns.items():
+            if name not in existing:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+                added.append(name)
+        return added
+    
     def add_profile(self, profile_url: str, username: Optional[str] = None) -> bool:
-        """Add a new profile to monitor."""
+        """Add a new profile to monitor, unless its URL or username (ignoring case) is stored."""
+        username = (username or profile_url.rstrip('/').split('/')[-1]).lower()
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT OR IGNORE INTO profiles (profile_url, username, last_checked)
-                    VALUES (?, ?, ?)
-                ''', (profile_url, username, datetime.now().isoformat()))
+                    SELECT ?, ?, ?
+                    WHERE NOT EXISTS (SELECT 1 FROM profiles WHERE username = ?)
+                ''', (profile_url, username, datetime.now().isoformat(), username))
                 conn.commit()
                 return cursor.rowcount > 0
         except Exception as e:
             logging.error(f"Error adding profile {profile_url}: {e}")
             return False
     
+    def add_profiles_bulk(self, profiles: List[tuple]) -> int:
+        """Add (profile_url, username) pairs in a single transaction.
+        
+        Profiles whose URL or username (ignoring case) is already stored are
+        skipped. Returns the number of profiles added.
+        """
+        if not profiles:
+            return 0
+        try:
+            now = datetime.now().isoformat()
+            profiles = [(profile_url, username.lower()) for profile_url, username in profiles]
+            with sqlite3.connect(self.db_path) as conn:
+                before = conn.total_changes
+                conn.executemany('''
+                    INSERT OR IGNORE INTO profiles (profile_url, username, last_checked)
+                    SELECT ?, ?, ?
+                    WHERE NOT EXISTS (SELECT 1 FROM profiles WHERE username = ?)
+                ''', [(profile_url, username, now, username) for profile_url, username in profiles])
+                conn.commit()
+                return conn.total_changes - before
+        except Exception as e:
+            logging.error(f"Error adding {len(profiles)} profiles: {e}")
+            return 0
+    
     def get_active_profiles(self) -> List[Dict]:
-        """Get all active profiles to monitor."""
+        """Get all active profiles that are due for a check.
+        
+        Profiles backing off after failures are left out until their
+        `next_check_after` time has passed.
+        """
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    SELECT profile_url, username, last_checked, total_posts_found
-                    FROM profiles WHERE active = TRUE
-                ''')
+                    SELECT profile_url, username, last_checked, total_posts_found, consecutive_failures
+                    FROM profiles
+                    WHERE active = TRUE AND (next_check_after IS NULL OR next_check_after <= ?)
+                ''', (datetime.now().isoformat(),))
                 columns = [description[0] for description in cursor.description]
                 return [dict(zip(columns, row)) for row in cursor.fetchall()]
         except Exception as e:
             logging.error(f"Error getting active profiles: {e}")
             return []
     
+    def record_profile_success(self, profile_url: str):
+        """Clear the failure state of a profile that was checked successfully."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE profiles
+                    SET consecutive_failures = 0, next_check_after = NULL, last_error = NULL
+                    WHERE profile_url = ? AND consecutive_failures > 0
+                ''', (profile_url,))
+                conn.commit()
+        except Exception as e:
+            logging.error(f"Error recording success for {profile_url}: {e}")
+    
+    def record_profile_failure(self, profile_url: str, reason: str, permanent: bool = False) -> Dict:
+        """Count a failed check and back the profile off exponentially.
+        
+        `permanent` failures (e.g. the profile no longer exists) deactivate the
+        profile once PROFILE_FAILURE_THRESHOLD consecutive failures are reached;
+        transient ones only delay the next check. Returns the updated state.
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT consecutive_failures FROM profiles WHERE profile_url = ?', (profile_url,))
+                row = cursor.fetchone()
+                failures = ((row[0] or 0) if row else 0) + 1
+                
+                backoff_minutes = min(PROFILE_BACKOFF_BASE_MINUTES * 2 ** (failures - 1), PROFILE_BACKOFF_MAX_MINUTES)
+                next_check_after = (datetime.now() + timedelta(minutes=backoff_minutes)).isoformat()
+                deactivate = permanent and failures >= PROFILE_FAILURE_THRESHOLD
+                
+                cursor.execute('''
+                    UPDATE profiles
+                    SET consecutive_failures = ?, next_check_after = ?, last_error = ?,
+                        active = CASE WHEN ? THEN FALSE ELSE active END,
+                        deactivated_reason = CASE WHEN ? THEN ? ELSE deactivated_reason END
+                    WHERE profile_url = ?
+                ''', (failures, next_check_after, reason, deactivate, deactivate, reason, profile_url))
+                conn.commit()
+            
+            if deactivate:
+                logging.warning(f"Deactivated profile {profile_url} after {failures} failures: {reason}")
+                self.log_scraping_action(profile_url, 'deactivate', 'error', reason)
+            else:
+                logging.warning(f"Profile {profile_url} failed {failures} time(s), "
+                                f"next check in {backoff_minutes} minutes: {reason}")
+            
+            return {
+                'consecutive_failures': failures,
+                'next_check_after': next_check_after,
+                'deactivated': deactivate
+            }
+        except Exception as e:
+            logging.error(f"Error recording failure for {profile_url}: {e}")
+            return {}
+    
+    def reactivate_profiles(self, profile: Optional[str] = None) -> int:
+        """Re-enable a deactivated or backed-off profile, or all of them when `profile` is None."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                query = '''
+                    UPDATE profiles
+                    SET active = TRUE, consecutive_failures = 0, next_check_after = NULL,
+                        last_error = NULL, deactivated_reason = NULL
+                    WHERE (active = FALSE OR consecutive_failures > 0)
+                '''
+                params = []
+                if profile:
+                    query += ' AND profile_url = ?'
+                    params.append(self._resolve_profile_url(profile))
+                cursor.execute(query, params)
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logging.error(f"Error reactivating profiles: {e}")
+            return 0
+    
+    def get_unhealthy_profiles(self) -> List[Dict]:
+        """Get profiles that are backing off or have been deactivated."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT profile_url, active, consecutive_failures, next_check_after,
+                           last_error, deactivated_reason
+                    FROM profiles
+                    WHERE active = FALSE OR consecutive_failures > 0
+                    ORDER BY active, consecutive_failures DESC
+                ''')
+                columns = [description[0] for description in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except Exception as e:
+            logging.error(f"Error getting profile health: {e}")
+            return []
+    
     def post_exists(self, post_url: str) -> bool:
         """Check if a post has already been scraped."""
         try:
@@ -107,16 +507,29 @@ class DatabaseManager:
             logging.error(f"Error checking if post exists: {e}")
             return False
     
+    def is_post_downloaded(self, post_url: str) -> Optional[bool]:
+        """Whether a scraped post has been downloaded; None if it was never scraped."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT downloaded FROM posts WHERE post_url = ?', (post_url,))
+                row = cursor.fetchone()
+                return bool(row[0]) if row else None
+        except Exception as e:
+            logging.error(f"Error checking if post was downloaded: {e}")
+            return None
+    
     def add_post(self, post_data: Dict) -> bool:
         """Add a new post to the database."""
         try:
+            scraped_date = datetime.now().isoformat()
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT OR IGNORE INTO posts 
                     (post_url, profile_url, title, description, price, image_urls, 
-                     post_date, scraped_date)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                     post_date, scraped_date, is_sold, price_nok)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (
                     post_data['post_url'],
                     post_data['profile_url'],
@@ -124,15 +537,140 @@ class DatabaseManager:
                     post_data.get('description', ''),
                     post_data.get('price', ''),
                     post_data.get('image_urls', '[]'),
-                    post_data.get('post_date', ''),
-                    datetime.now().isoformat()
+                    post_data.get('post_date') or post_data.get('created_date', ''),
+                    scraped_date,
+                    bool(post_data.get('is_sold', False)),
+                    post_data.get('price_nok')
                 ))
+                added = cursor.rowcount > 0
+                if added:
+                    self._add_to_stats(cursor, post_data['profile_url'], scraped_date, posts_found=1)
                 conn.commit()
-                return cursor.rowcount > 0
+                return added
         except Exception as e:
             logging.error(f"Error adding post: {e}")
             return False
     
+    def iter_posts(self, profile: Optional[str] = None, since: Optional[str] = None,
+                   until: Optional[str] = None, sold: Optional[bool] = None,
+                   downloaded: Optional[bool] = None, batch_size: int = 1000) -> Iterator[Dict]:
+        """Stream posts matching the given filters in batches of `batch_size` rows.
+        
+        `profile` may be a full profile URL or a bare username. `since` and
+        `until` are ISO dates/timestamps matched against the scraped date; a bare
+        `until` date includes that whole day. Database errors are raised so a
+        partial stream is not mistaken for a complete one.
+        """
+        conditions = []
+        params = []
+        
+        if profile:
+            conditions.append('profile_url = ?')
+            params.append(self._resolve_profile_url(profile))
+        if since:
+            conditions.append('scraped_date >= ?')
+            params.append(since)
+        if until:
+            if len(until) == 10:
+                until = (datetime.fromisoformat(until) + timedelta(days=1)).date().isoformat()
+            conditions.append('scraped_date < ?')
+            params.append(until)
+        if sold is not None:
+            conditions.append('is_sold = ?')
+            params.append(sold)
+        if downloaded is not None:
+            conditions.append('downloaded = ?')
+            params.append(downloaded)
+        
+        query = '''
+            SELECT post_url, profile_url, title, description, price, image_urls,
+                   post_date, scraped_date, is_sold, downloaded, file_paths
+            FROM posts
+        '''
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY id'
+        
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            columns = [description[0] for description in cursor.description]
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(columns, row))
+    
+    def search_posts(self, query: str, profile: Optional[str] = None,
+                     min_price: Optional[int] = None, max_price: Optional[int] = None,
+                     limit: int = 20) -> List[Dict]:
+        """Search post titles and descriptions, best matches first.
+        
+        Every word in `query` must appear in the post. Prices are in NOK.
+        """
+        terms = query.split()
+        if not terms:
+            return []
+        
+        conditions = []
+        params = []
+        if profile:
+            conditions.append('p.profile_url = ?')
+            params.append(self._resolve_profile_url(profile))
+        if min_price is not None:
+            conditions.append('p.price_nok >= ?')
+            params.append(min_price)
+        if max_price is not None:
+            conditions.append('p.price_nok <= ?')
+            params.append(max_price)
+        filters = ''.join(f' AND {condition}' for condition in conditions)
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                if self.fts_enabled:
+                    # Quote each term so user input is never parsed as FTS syntax
+                    match = ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+                    cursor.execute(f'''
+                        SELECT p.post_url, p.profile_url, p.title, p.price, p.price_nok,
+                               p.scraped_date, p.is_sold,
+                               bm25(posts_fts, 10.0, 1.0) AS score
+                        FROM posts_fts
+                        JOIN posts p ON p.id = posts_fts.rowid
+                        WHERE posts_fts MATCH ?{filters}
+                        ORDER BY score
+                        LIMIT ?
+                    ''', [match] + params + [limit])
+                else:
+                    like = ' AND '.join('(p.title LIKE ? OR p.description LIKE ?)' for _ in terms)
+                    like_params = [f'%{term}%' for term in terms for _ in range(2)]
+                    cursor.execute(f'''
+                        SELECT p.post_url, p.profile_url, p.title, p.price, p.price_nok,
+                               p.scraped_date, p.is_sold, 0 AS score
+                        FROM posts p
+                        WHERE {like}{filters}
+                        ORDER BY p.id DESC
+                        LIMIT ?
+                    ''', like_params + params + [limit])
+                columns = [description[0] for description in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except Exception as e:
+            logging.error(f"Error searching posts for '{query}': {e}")
+            return []
+    
+    def _resolve_profile_url(self, profile: str) -> str:
+        """Exact stored profile_url for a profile given as a full URL or a bare username."""
+        parsed = parse_profile(profile)
+        if parsed is None:
+            return profile
+        profile_url, username = parsed
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT profile_url FROM profiles WHERE username = ? LIMIT 1', (username,))
+            row = cursor.fetchone()
+        return row[0] if row else profile_url
+    
     def update_profile_last_checked(self, profile_url: str, posts_count: int = 0):
         """Update when a profile was last checked."""
         try:
@@ -147,66 +685,534 @@ class DatabaseManager:
         except Exception as e:
             logging.error(f"Error updating profile last checked: {e}")
     
-    def mark_post_downloaded(self, post_url: str, file_paths: List[str]):
+    def mark_post_downloaded(self, post_url: str, file_paths: List[str], bytes_downloaded: int = 0):
         """Mark a post as downloaded and store file paths."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                self._mark_downloaded(cursor, post_url, file_paths, bytes_downloaded)
+                conn.commit()
+        except Exception as e:
+            logging.error(f"Error marking post as downloaded: {e}")
+    
+    def _mark_downloaded(self, cursor, post_url: str, file_paths: List[str], bytes_downloaded: int):
+        """Mark a post as downloaded within the caller's transaction."""
+        import json
+        cursor.execute('SELECT profile_url, downloaded FROM posts WHERE post_url = ?', (post_url,))
+        row = cursor.fetchone()
+        if row:
+            self._add_to_stats(cursor, row[0], posts_downloaded=0 if row[1] else 1,
+                               bytes_downloaded=bytes_downloaded)
+        cursor.execute('''
+            UPDATE posts 
+            SET downloaded = TRUE, file_paths = ?
+            WHERE post_url = ?
+        ''', (json.dumps(file_paths), post_url))
+    
+    def add_post_files(self, post_url: str, source_url: str, files: List[Dict]):
+        """Record the stored files (original and derivatives) for one downloaded image."""
+        try:
+            now = datetime.now().isoformat()
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO post_files
+                    (post_url, source_url, variant, file_path, width, height, size_bytes,
+                     created_date, phash, last_accessed)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [(
+                    post_url,
+                    source_url,
+                    file_info['variant'],
+                    str(file_info['file_path']),
+                    file_info.get('width'),
+                    file_info.get('height'),
+                    file_info.get('size_bytes'),
+                    now,
+                    file_info.get('phash'),
+                    now
+                ) for file_info in files])
+                conn.commit()
+        except Exception as e:
+            logging.error(f"Error recording files for post {post_url}: {e}")
+    
+    def add_post_metadata_locations(self, locations: List[tuple], downloads: Optional[Dict[str, tuple]] = None) -> bool:
+        """Record (post_url, file_path, byte_offset, byte_length) of appended metadata lines.
+        
+        `downloads` maps post URLs to (file_paths, bytes_downloaded) of posts
+        to mark as downloaded along with their metadata. Everything is written
+        in one transaction; returns False if it failed.
+        """
+        try:
+            now = datetime.now().isoformat()
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO post_metadata
+                    (post_url, file_path, byte_offset, byte_length, written_date)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [tuple(location) + (now,) for location in locations])
+                for post_url, (file_paths, bytes_downloaded) in (downloads or {}).items():
+                    self._mark_downloaded(cursor, post_url, file_paths, bytes_downloaded)
+                conn.commit()
+                return True
+        except Exception as e:
+            logging.error(f"Error recording post metadata locations: {e}")
+            return False
+    
+    def get_post_metadata_location(self, post_url: str) -> Optional[Dict]:
+        """Get the file, offset and length of a post's latest metadata line."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT file_path, byte_offset, byte_length FROM post_metadata WHERE post_url = ?
+                ''', (post_url,))
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                columns = [description[0] for description in cursor.description]
+                return dict(zip(columns, row))
+        except Exception as e:
+            logging.error(f"Error getting post metadata location: {e}")
+            return None
+    
+    def get_original_locations(self, source_urls: List[str]) -> Dict[str, str]:
+        """Map image URLs that were downloaded before to their stored original."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                placeholders = ','.join('?' * len(source_urls))
+                cursor.execute(f'''
+                    SELECT source_url, file_path FROM post_files
+                    WHERE variant = 'original' AND source_url IN ({placeholders})
+                ''', list(source_urls))
+                return dict(cursor.fetchall())
+        except Exception as e:
+            logging.error(f"Error looking up stored originals: {e}")
+            return {}
+    
+    def get_post_files(self, post_url: str, variant: Optional[str] = None) -> List[Dict]:
+        """Get stored files for a post, optionally limited to one variant."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                query = '''
+                    SELECT source_url, variant, file_path, width, height, size_bytes, phash
+                    FROM post_files WHERE post_url = ?
+                '''
+                params = [post_url]
+                if variant:
+                    query += ' AND variant = ?'
+                    params.append(variant)
+                cursor.execute(query + ' ORDER BY id', params)
+                columns = [description[0] for description in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except Exception as e:
+            logging.error(f"Error getting files for post {post_url}: {e}")
+            return []
+    
+    def update_seen_posts(self, posts: List[Dict]):
+        """Refresh posts still listed on their profile.
+        
+        Their stored files are marked as recently used and their sold status
+        is updated, in one transaction.
+        """
+        if not posts:
+            return
+        try:
+            now = datetime.now().isoformat()
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    'UPDATE post_files SET last_accessed = ? WHERE post_url = ?',
+                    [(now, post['post_url']) for post in posts]
+                )
+                cursor.executemany(
+                    'UPDATE posts SET is_sold = ? WHERE post_url = ? AND is_sold IS NOT ?',
+                    [(bool(post.get('is_sold')), post['post_url'], bool(post.get('is_sold'))) for post in posts]
+                )
+                conn.commit()
+        except Exception as e:
+            logging.error(f"Error updating seen posts: {e}")
+    
+    def get_stored_file_totals(self) -> Dict:
+        """Number and total size of stored image files."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM post_files')
+                files, total_bytes = cursor.fetchone()
+                return {'files': files, 'bytes': total_bytes}
+        except Exception as e:
+            logging.error(f"Error getting stored file totals: {e}")
+            return {'files': 0, 'bytes': 0}
+    
+    def get_least_recently_used_images(self, limit: int, accessed_before: Optional[str] = None) -> List[Dict]:
+        """Get up to `limit` least recently used images, optionally only those older than a timestamp.
+        
+        Each image comes with all of its stored files (original and
+        derivatives) in `files` and their combined `size_bytes`, so it can be
+        evicted as a unit.
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                query = 'SELECT post_url, source_url, last_accessed FROM post_files'
+                params = []
+                if accessed_before:
+                    query += ' WHERE last_accessed < ?'
+                    params.append(accessed_before)
+                query += ' ORDER BY last_accessed, post_url, id LIMIT ?'
+                # An image has one row per variant, so this many rows cover `limit` images
+                params.append(limit * (len(IMAGE_DERIVATIVE_SIZES) + 1))
+                cursor.execute(query, params)
+                images = {}
+                for post_url, source_url, last_accessed in cursor.fetchall():
+                    if (post_url, source_url) not in images:
+                        if len(images) >= limit:
+                            break
+                        images[(post_url, source_url)] = {
+                            'post_url': post_url,
+                            'source_url': source_url,
+                            'last_accessed': last_accessed
+                        }
+                
+                for image in images.values():
+                    cursor.execute('''
+                        SELECT post_url, variant, file_path, size_bytes FROM post_files
+                        WHERE post_url = ? AND source_url IS ? ORDER BY id
+                    ''', (image['post_url'], image['source_url']))
+                    columns = [description[0] for description in cursor.description]
+                    image['files'] = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                    image['size_bytes'] = sum(file_info['size_bytes'] or 0 for file_info in image['files'])
+                return list(images.values())
+        except Exception as e:
+            logging.error(f"Error getting least recently used images: {e}")
+            return []
+    
+    def remove_post_files(self, files: List[Dict]) -> bool:
+        """Forget evicted files and update the affected posts to match what is left.
+        
+        Only the evicted paths are dropped from a post's `file_paths`; other
+        entries such as its metadata file stay listed. Returns False if the
+        update failed.
+        """
+        if not files:
+            return True
         try:
             import json
+            removed_paths = {}
+            for file_info in files:
+                removed_paths.setdefault(file_info['post_url'], set()).add(str(file_info['file_path']))
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                removed_bytes = {}
+                for file_info in files:
+                    cursor.execute('''
+                        SELECT post_url, size_bytes FROM post_files WHERE file_path = ?
+                    ''', (str(file_info['file_path']),))
+                    row = cursor.fetchone()
+                    if row:
+                        removed_bytes[row[0]] = removed_bytes.get(row[0], 0) + (row[1] or 0)
+                cursor.executemany(
+                    'DELETE FROM post_files WHERE file_path = ?',
+                    [(str(file_info['file_path']),) for file_info in files]
+                )
+                for post_url, paths in removed_paths.items():
+                    cursor.execute('''
+                        SELECT 1 FROM post_files
+                        WHERE post_url = ? AND variant = 'original' LIMIT 1
+                    ''', (post_url,))
+                    has_images = cursor.fetchone() is not None
+                    cursor.execute('SELECT profile_url, downloaded, file_paths FROM posts WHERE post_url = ?',
+                                   (post_url,))
+                    post = cursor.fetchone()
+                    if not post:
+                        continue
+                    # Totals track what is stored now; hourly and daily buckets keep history
+                    self._add_to_stats(cursor, post[0], periods=('total',),
+                                       posts_downloaded=-1 if post[1] and not has_images else 0,
+                                       bytes_downloaded=-removed_bytes.get(post_url, 0))
+                    kept = [path for path in json.loads(post[2] or '[]') if path not in paths]
+                    cursor.execute('''
+                        UPDATE posts SET downloaded = ?, file_paths = ?
+                        WHERE post_url = ?
+                    ''', (has_images, json.dumps(kept), post_url))
+                conn.commit()
+                return True
+        except Exception as e:
+            logging.error(f"Error removing evicted files: {e}")
+            return False
+    
+    def get_phash_candidates(self, band_values: List[List[int]]) -> List[tuple]:
+        """Get (phash, post_url, file_path) of originals sharing a band value.
+        
+        `band_values[i]` lists the accepted values of band i; each band is
+        looked up through its own index and the union is returned. Database
+        errors are raised so a failed lookup is not mistaken for no matches.
+        """
+        candidates = {}
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            for expression, values in zip(PHASH_BANDS, band_values):
+                placeholders = ','.join('?' * len(values))
+                cursor.execute(f'''
+                    SELECT phash, post_url, file_path FROM post_files
+                    WHERE phash IS NOT NULL AND {expression} IN ({placeholders})
+                    AND variant = 'original'
+                ''', list(values))
+                for row in cursor.fetchall():
+                    candidates[row[2]] = row
+        return list(candidates.values())
+    
+    def get_files_missing_phash(self) -> List[Dict]:
+        """Get original images that have no perceptual hash yet and have not failed hashing."""
+        try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    UPDATE posts 
-                    SET downloaded = TRUE, file_paths = ?
-                    WHERE post_url = ?
-                ''', (json.dumps(file_paths), post_url))
+                    SELECT post_url, file_path FROM post_files
+                    WHERE variant = 'original' AND phash IS NULL AND phash_error IS NULL
+                ''')
+                columns = [description[0] for description in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except Exception as e:
+            logging.error(f"Error getting files missing perceptual hashes: {e}")
+            return []
+    
+    def set_file_phashes(self, hashes: List[tuple], failures: Optional[List[tuple]] = None):
+        """Store (phash, file_path) pairs and (error, file_path) pairs of failed images in one transaction."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.executemany('UPDATE post_files SET phash = ? WHERE file_path = ?', hashes)
+                cursor.executemany('UPDATE post_files SET phash_error = ? WHERE file_path = ?', failures or [])
                 conn.commit()
         except Exception as e:
-            logging.error(f"Error marking post as downloaded: {e}")
+            logging.error(f"Error storing perceptual hashes: {e}")
     
-    def log_scraping_action(self, profile_url: str, action: str, status: str, message: str = ""):
-        """Log a scraping action."""
+    def add_watch_rule(self, name: str, keywords: Optional[List[str]] = None,
+                       min_price: Optional[int] = None, max_price: Optional[int] = None,
+                       sizes: Optional[List[str]] = None, colors: Optional[List[str]] = None) -> Optional[int]:
+        """Add a watch rule and return its id; inverted price bounds are swapped."""
+        try:
+            import json
+            if min_price is not None and max_price is not None and min_price > max_price:
+                min_price, max_price = max_price, min_price
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO watch_rules (name, keywords, min_price, max_price, sizes, colors, created_date)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    name,
+                    json.dumps(keywords or []),
+                    min_price,
+                    max_price,
+                    json.dumps(sizes or []),
+                    json.dumps(colors or []),
+                    datetime.now().isoformat()
+                ))
+                conn.commit()
+                return cursor.lastrowid
+        except Exception as e:
+            logging.error(f"Error adding watch rule {name}: {e}")
+            return None
+    
+    def remove_watch_rule(self, rule_id: int) -> bool:
+        """Delete a watch rule."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM watch_rules WHERE id = ?', (rule_id,))
+                conn.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            logging.error(f"Error removing watch rule {rule_id}: {e}")
+            return False
+    
+    def get_watch_rules(self) -> List[Dict]:
+        """Get all active watch rules."""
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
+                    SELECT id, name, keywords, min_price, max_price, sizes, colors
+                    FROM watch_rules WHERE active = TRUE ORDER BY id
+                ''')
+                columns = [description[0] for description in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except Exception as e:
+            logging.error(f"Error getting watch rules: {e}")
+            return []
+    
+    def get_watch_rules_version(self) -> tuple:
+        """A cheap signature that changes whenever rules are added, removed or toggled."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT COUNT(*), COALESCE(MAX(id), 0), COALESCE(SUM(active), 0) FROM watch_rules
+                ''')
+                return cursor.fetchone()
+        except Exception as e:
+            logging.error(f"Error getting watch rules version: {e}")
+            return ()
+    
+    def add_watch_matches(self, matches: List[tuple]) -> int:
+        """Queue (rule_id, post_url) matches in the outbox, ignoring duplicates."""
+        if not matches:
+            return 0
+        try:
+            now = datetime.now().isoformat()
+            with sqlite3.connect(self.db_path) as conn:
+                before = conn.total_changes
+                conn.executemany('''
+                    INSERT OR IGNORE INTO watch_matches (rule_id, post_url, matched_date)
+                    VALUES (?, ?, ?)
+                ''', [(rule_id, post_url, now) for rule_id, post_url in matches])
+                conn.commit()
+                return conn.total_changes - before
+        except Exception as e:
+            logging.error(f"Error adding watch matches: {e}")
+            return 0
+    
+    def get_watch_matches(self, undelivered_only: bool = True, limit: int = 100) -> List[Dict]:
+        """Get queued matches with their rule name and post details, oldest first."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                query = '''
+                    SELECT m.id, m.rule_id, r.name AS rule_name, m.post_url, p.title, p.price,
+                           m.matched_date, m.delivered
+                    FROM watch_matches m
+                    LEFT JOIN watch_rules r ON r.id = m.rule_id
+                    LEFT JOIN posts p ON p.post_url = m.post_url
+                '''
+                if undelivered_only:
+                    query += ' WHERE m.delivered = FALSE'
+                cursor.execute(query + ' ORDER BY m.id LIMIT ?', (limit,))
+                columns = [description[0] for description in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except Exception as e:
+            logging.error(f"Error getting watch matches: {e}")
+            return []
+    
+    def mark_watch_matches_delivered(self, match_ids: List[int]):
+        """Mark outbox entries as delivered."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    'UPDATE watch_matches SET delivered = TRUE WHERE id = ?',
+                    [(match_id,) for match_id in match_ids]
+                )
+                conn.commit()
+        except Exception as e:
+            logging.error(f"Error marking watch matches delivered: {e}")
+    
+    def log_scraping_action(self, profile_url: str, action: str, status: str, message: str = ""):
+        """Log a scraping action.
+        
+        Rows are buffered and written in batches of LOG_BATCH_SIZE; call
+        `flush_logs` to write pending rows immediately. Errors are counted in
+        the stats rollup right away, so reports do not wait for the batch.
+        """
+        timestamp = datetime.now().isoformat()
+        if status == 'error' and profile_url:
+            try:
+                with sqlite3.connect(self.db_path) as conn:
+                    self._add_to_stats(conn.cursor(), profile_url, timestamp, errors=1)
+                    conn.commit()
+            except Exception as e:
+                logging.error(f"Error counting scraping error: {e}")
+        with self._log_lock:
+            self._log_buffer.append((timestamp, profile_url, action, status, message))
+            if len(self._log_buffer) < LOG_BATCH_SIZE:
+                return
+        self.flush_logs()
+    
+    def flush_logs(self):
+        """Write all buffered scraping log rows in one transaction."""
+        with self._log_lock:
+            rows, self._log_buffer = self._log_buffer, []
+        if not rows:
+            return
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
                     INSERT INTO scraping_logs (timestamp, profile_url, action, status, message)
                     VALUES (?, ?, ?, ?, ?)
-                ''', (datetime.now().isoformat(), profile_url, action, status, message))
+                ''', rows)
                 conn.commit()
         except Exception as e:
-            logging.error(f"Error logging scraping action: {e}")
+            logging.error(f"Error logging scraping actions: {e}")
     
     def get_statistics(self) -> Dict:
-        """Get scraping statistics."""
+        """Get scraping statistics from the rollup counters."""
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 
-                # Total posts
-                cursor.execute('SELECT COUNT(*) FROM posts')
-                total_posts = cursor.fetchone()[0]
-                
-                # Downloaded posts
-                cursor.execute('SELECT COUNT(*) FROM posts WHERE downloaded = TRUE')
-                downloaded_posts = cursor.fetchone()[0]
+                # All-time totals
+                cursor.execute('''
+                    SELECT posts_found, posts_downloaded, bytes_downloaded, errors FROM stats_rollup
+                    WHERE profile_url = ? AND period = 'total' AND bucket = ''
+                ''', (ALL_PROFILES,))
+                total_posts, downloaded_posts, stored_bytes, total_errors = cursor.fetchone() or (0, 0, 0, 0)
                 
                 # Active profiles
                 cursor.execute('SELECT COUNT(*) FROM profiles WHERE active = TRUE')
                 active_profiles = cursor.fetchone()[0]
                 
-                # Recent activity (last 24 hours)
+                # Recent activity (the last 24 hourly buckets)
+                since = (datetime.now() - timedelta(hours=23)).isoformat()[:STATS_PERIODS['hour']]
                 cursor.execute('''
-                    SELECT COUNT(*) FROM posts 
-                    WHERE scraped_date > datetime('now', '-1 day')
-                ''')
-                recent_posts = cursor.fetchone()[0]
+                    SELECT COALESCE(SUM(posts_found), 0), COALESCE(SUM(errors), 0) FROM stats_rollup
+                    WHERE profile_url = ? AND period = 'hour' AND bucket >= ?
+                ''', (ALL_PROFILES, since))
+                recent_posts, recent_errors = cursor.fetchone()
                 
                 return {
                     'total_posts': total_posts,
                     'downloaded_posts': downloaded_posts,
                     'active_profiles': active_profiles,
                     'recent_posts': recent_posts,
+                    'recent_errors': recent_errors,
+                    'total_errors': total_errors,
+                    'stored_mb': round(stored_bytes / (1024 * 1024), 2),
                     'download_percentage': (downloaded_posts / total_posts * 100) if total_posts > 0 else 0
                 }
         except Exception as e:
             logging.error(f"Error getting statistics: {e}")
             return {}
+    
+    def get_trends(self, profile: Optional[str] = None, period: str = 'day', limit: int = 14) -> List[Dict]:
+        """Get the most recent hourly or daily rollup buckets, newest first.
+        
+        Without `profile` the buckets cover all profiles combined.
+        """
+        try:
+            if profile:
+                scope = 'profile_url = ?'
+                params = [self._resolve_profile_url(profile)]
+            else:
+                scope = 'profile_url = ?'
+                params = [ALL_PROFILES]
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT bucket, SUM(posts_found) AS posts_found,
+                           SUM(posts_downloaded) AS posts_downloaded,
+                           SUM(bytes_downloaded) AS bytes_downloaded, SUM(errors) AS errors
+                    FROM stats_rollup
+                    WHERE period = ? AND {scope}
+                    GROUP BY bucket ORDER BY bucket DESC LIMIT ?
+                ''', [period] + params + [limit])
+                columns = [description[0] for description in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except Exception as e:
+            logging.error(f"Error getting {period} trends: {e}")
+            return []
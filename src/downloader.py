@@ -1,76 +1,139 @@
-import os
+import io
 import json
 import hashlib
-import requests
 import logging
-from typing import List, Dict, Optional
+import posixpath
+from datetime import datetime, timedelta
+from typing import BinaryIO, List, Dict, Optional
 from urllib.parse import urlparse
 from PIL import Image
 from pathlib import Path
 
-from config import DOWNLOADS_FOLDER
+from config import IMAGE_MAX_DIMENSION, IMAGE_DERIVATIVE_SIZES
 from database import DatabaseManager
+from image_index import dhash, to_signed64
+from log_utils import progress
+from metadata_store import MetadataStore
+from storage import StorageBackend, create_storage
+from transport import HttpTransport, get_shared_transport
 
 class FileDownloader:
     """Handles downloading and saving files from scraped posts."""
     
-    def __init__(self):
+    # Extensions `_image_key` can give a stored original
+    _IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif')
+    
+    def __init__(self, transport: Optional[HttpTransport] = None, storage: Optional[StorageBackend] = None):
         self.db = DatabaseManager()
-        self.downloads_folder = Path(DOWNLOADS_FOLDER)
-        self.downloads_folder.mkdir(parents=True, exist_ok=True)
+        self.transport = transport or get_shared_transport()
+        self.storage = storage or create_storage()
+        self.metadata_store = MetadataStore(self.db, self.storage)
+        
+    def download_post_content(self, post_data: Dict) -> Optional[List[str]]:
+        """Download all content for a post.
         
-    def download_post_content(self, post_data: Dict) -> List[str]:
-        """Download all content for a post and return file paths."""
+        Returns the stored locations of the post's original images, or None if
+        the download failed. The post is marked downloaded when its metadata
+        line is flushed, in the same transaction that indexes the line.
+        """
         downloaded_files = []
         
         try:
-            # Create folder for this post
-            post_folder = self._create_post_folder(post_data)
+            # Storage folder for this post's profile
+            post_folder = self._get_post_folder(post_data)
             
             # Download images
             image_urls = json.loads(post_data.get('image_urls', '[]'))
-            print(f"      📸 Downloading {len(image_urls)} images...")
             
+            # Skip images already in storage, e.g. written by another node
+            stored_files = self._find_stored_images(image_urls, post_folder)
+            
+            downloaded_images = 0
+            downloaded_bytes = 0
             for i, img_url in enumerate(image_urls):
-                print(f"        🔽 Image {i+1}/{len(image_urls)}...", end="")
-                file_path = self._download_image(img_url, post_folder, f"image_{i+1}")
-                if file_path:
-                    print(" ✅")
-                    downloaded_files.append(str(file_path))
-                else:
-                    print(" ❌")
+                if img_url in stored_files:
+                    downloaded_images += 1
+                    downloaded_files.append(stored_files[img_url][0]['file_path'])
+                    untracked = [file_info for file_info in stored_files[img_url] if file_info.get('untracked')]
+                    if untracked:
+                        downloaded_bytes += sum(file_info['size_bytes'] for file_info in untracked)
+                        self.db.add_post_files(post_data['post_url'], img_url, untracked)
+                    continue
+                progress.update(f"        🔽 Image {i+1}/{len(image_urls)}...")
+                image_files = self._download_image(img_url, post_folder, f"image_{i+1}")
+                if image_files:
+                    downloaded_images += 1
+                    downloaded_files.append(image_files[0]['file_path'])
+                    downloaded_bytes += sum(file_info['size_bytes'] for file_info in image_files)
+                    self.db.add_post_files(post_data['post_url'], img_url, image_files)
             
-            # Save post metadata
-            metadata_file = self._save_post_metadata(post_data, post_folder)
-            if metadata_file:
-                downloaded_files.append(str(metadata_file))
+            if downloaded_images < len(image_urls):
+                progress.done(f"      📸 Downloaded {downloaded_images}/{len(image_urls)} images")
             
-            # Mark as downloaded in database
-            if downloaded_files:
-                self.db.mark_post_downloaded(post_data['post_url'], downloaded_files)
-                logging.info(f"Downloaded {len(downloaded_files)} files for post: {post_data['title']}")
+            # Metadata alone does not make a download; leave the post for a retry
+            if image_urls and not downloaded_images:
+                return None
+            
+            # Save post metadata; the post is marked downloaded once it is stored
+            if not self._save_post_metadata(post_data, post_folder, (downloaded_files, downloaded_bytes)):
+                return None
+            logging.info(f"Downloaded {len(downloaded_files)} images for post: {post_data['title']}")
             
             return downloaded_files
             
         except Exception as e:
             logging.error(f"Error downloading post content: {e}")
-            return []
+            return None
     
-    def _create_post_folder(self, post_data: Dict) -> Path:
-        """Create username-organized folder structure."""
-        # Extract username from profile URL
-        profile_name = self._get_profile_name(post_data['profile_url'])
+    def _find_stored_images(self, image_urls: List[str], folder: str) -> Dict[str, List[Dict]]:
+        """Find images of a post that are already in storage.
         
-        # Create username-based folder structure
-        user_folder = self.downloads_folder / profile_name
-        images_folder = user_folder / 'images'
-        metadata_folder = user_folder / 'metadata'
+        Images downloaded before are checked at the location recorded in
+        `post_files`. For other images, everything stored under the key
+        prefix a download would use is listed in one request per image; the
+        prefix leaves out the extension, which depends on the content type
+        the server sends. Files found there were written by another node and
+        come back marked `untracked` so they can be recorded here. Returns the
+        stored files per image URL, original first.
+        """
+        if not image_urls:
+            return {}
         
-        # Create all necessary folders
-        images_folder.mkdir(parents=True, exist_ok=True)
-        metadata_folder.mkdir(parents=True, exist_ok=True)
+        known = self.db.get_original_locations(image_urls)
+        prefixes = {
+            img_url: self._image_prefix(folder, f"image_{i+1}", img_url)
+            for i, img_url in enumerate(image_urls) if img_url not in known
+        }
         
-        return user_folder
+        known_sizes = self.storage.existing(known.values())
+        stored_files = {
+            img_url: [{'variant': 'original', 'file_path': location, 'size_bytes': known_sizes[location],
+                       'untracked': False}]
+            for img_url, location in known.items() if location in known_sizes
+        }
+        
+        listed = self.storage.list_prefixes(prefixes.values())
+        for img_url, prefix in prefixes.items():
+            prefix_location = self.storage.location(prefix)
+            names = {location[len(prefix_location):]: location
+                     for location in listed if location.startswith(prefix_location)}
+            # The original is the name that is just an extension; derivatives add "_<variant>"
+            ext = next((name for name in names if name in self._IMAGE_EXTENSIONS), None)
+            if ext is None:
+                continue
+            files = [('original', names[ext])] + [
+                (variant, names[f"_{variant}{ext}"])
+                for variant in IMAGE_DERIVATIVE_SIZES if f"_{variant}{ext}" in names
+            ]
+            stored_files[img_url] = [
+                {'variant': variant, 'file_path': location, 'size_bytes': listed[location], 'untracked': True}
+                for variant, location in files
+            ]
+        return stored_files
+    
+    def _get_post_folder(self, post_data: Dict) -> str:
+        """Username-organized storage folder for a post's files."""
+        return self._get_profile_name(post_data['profile_url'])
     
     def _get_profile_name(self, profile_url: str) -> str:
         """Extract profile name from URL."""
@@ -87,85 +150,162 @@ class FileDownloader:
             filename = filename.replace(char, '_')
         return filename[:50]
     
-    def _download_image(self, img_url: str, folder: Path, base_name: str) -> Optional[Path]:
-        """Download a single image with unique naming to prevent overwrites."""
-        try:
-            response = requests.get(img_url, timeout=30, stream=True)
-            response.raise_for_status()
-            
-            unique_id = self._extract_unique_id_from_url(img_url)
-            
-            # Determine file extension
-            content_type = response.headers.get('content-type', '')
-            if 'jpeg' in content_type or 'jpg' in content_type:
-                ext = '.jpg'
-            elif 'png' in content_type:
-                ext = '.png'
-            elif 'gif' in content_type:
-                ext = '.gif'
-            elif 'webp' in content_type:
+    def _image_prefix(self, folder: str, base_name: str, img_url: str) -> str:
+        """Storage key of an image without its extension, unique per image URL."""
+        return f"{folder}/images/{base_name}_{self._extract_unique_id_from_url(img_url)}"
+    
+    def _image_key(self, folder: str, base_name: str, img_url: str, content_type: str = '') -> str:
+        """Storage key for an image, unique per image URL to prevent overwrites."""
+        # Determine file extension
+        if 'jpeg' in content_type or 'jpg' in content_type:
+            ext = '.jpg'
+        elif 'png' in content_type:
+            ext = '.png'
+        elif 'gif' in content_type:
+            ext = '.gif'
+        elif 'webp' in content_type:
+            ext = '.jpg'
+        else:
+            parsed_url = urlparse(img_url)
+            path_ext = Path(parsed_url.path).suffix
+            if path_ext == '.webp':
                 ext = '.jpg'
             else:
-                parsed_url = urlparse(img_url)
-                path_ext = Path(parsed_url.path).suffix
-                if path_ext == '.webp':
-                    ext = '.jpg'
-                else:
-                    ext = path_ext if path_ext in ['.jpg', '.jpeg', '.png', '.gif'] else '.jpg'
-            
-            unique_filename = f"{base_name}_{unique_id}{ext}"
-            file_path = folder / 'images' / unique_filename
-            
-            with open(file_path, 'wb') as f:
+                ext = path_ext if path_ext in self._IMAGE_EXTENSIONS else '.jpg'
+        
+        return self._image_prefix(folder, base_name, img_url) + ext
+    
+    def _derivative_key(self, key: str, variant: str) -> str:
+        """Storage key of a resized derivative of the image at `key`."""
+        stem, ext = posixpath.splitext(key)
+        return f"{stem}_{variant}{ext}"
+    
+    def _download_image(self, img_url: str, folder: str, base_name: str) -> Optional[List[Dict]]:
+        """Download a single image into storage.
+        
+        The image is buffered in memory rather than on local disk. Returns the
+        stored files, original first, as produced by
+        `_convert_and_optimize_image`.
+        """
+        try:
+            with self.transport.get(img_url, stream=True) as response:
+                response.raise_for_status()
+                
+                key = self._image_key(folder, base_name, img_url, response.headers.get('content-type', ''))
+                
+                data = io.BytesIO()
                 for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            
-            self._convert_and_optimize_image(file_path, ext)
+                    data.write(chunk)
+                data.seek(0)
             
-            logging.debug(f"Downloaded image: {file_path}")
-            return file_path
+            image_files = self._convert_and_optimize_image(data, key)
+            if image_files:
+                logging.debug(f"Downloaded image: {key}")
+            return image_files
             
         except Exception as e:
             logging.error(f"Error downloading image {img_url}: {e}")
             return None
     
-    def _convert_and_optimize_image(self, file_path: Path, target_ext: str):
-        """Convert webp to jpg if needed, then verify and optimize image."""
+    def _convert_and_optimize_image(self, data: BinaryIO, key: str) -> Optional[List[Dict]]:
+        """Convert webp to jpg if needed, cap the image size and store it with derivatives.
+        
+        The image is decoded once; JPEGs are decoded at a reduced scale when
+        they are much larger than IMAGE_MAX_DIMENSION, and each derivative is
+        resized from the next larger one. Derivatives are only made for sizes
+        smaller than the image. The original's record also carries
+        a perceptual hash taken from the smallest rendition. Returns a list of
+        file records (variant, file_path, width, height, size_bytes), original
+        first; nothing is left in storage if processing fails.
+        """
+        image_files = []
         try:
-            with Image.open(file_path) as img:
-                if target_ext == '.jpg' and (img.format == 'WEBP' or file_path.suffix.lower() == '.webp'):
-                    if img.mode in ('RGBA', 'LA', 'P'):
-                        rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-                        if img.mode == 'P':
-                            img = img.convert('RGBA')
-                        rgb_img.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                        img = rgb_img
-                    elif img.mode != 'RGB':
-                        img = img.convert('RGB')
-                    
-                    img.save(file_path, 'JPEG', optimize=True, quality=90)
-                    logging.debug(f"Converted WEBP to JPG: {file_path}")
+            target_ext = posixpath.splitext(key)[1]
+            with Image.open(data) as img:
+                needs_conversion = target_ext == '.jpg' and img.format == 'WEBP'
+                needs_resize = img.width > IMAGE_MAX_DIMENSION or img.height > IMAGE_MAX_DIMENSION
+                
+                img.draft(None, (IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+                img.load()
+                
+                if target_ext == '.jpg':
+                    img = self._to_rgb(img)
+                
+                if needs_resize:
+                    img.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION), Image.Resampling.LANCZOS, reducing_gap=3.0)
+                
+                if needs_conversion or needs_resize:
+                    original = self._encode_image(img, target_ext, quality=90 if not needs_resize else 85)
+                    logging.debug(f"{'Converted' if needs_conversion else 'Optimized large'} image: {key}")
                 else:
-                    img.verify()
-                    img = Image.open(file_path)
+                    data.seek(0)
+                    original = data
+                
+                image_files.append(self._store_image('original', key, original, img))
                 
-                if img.width > 2000 or img.height > 2000:
-                    img.thumbnail((2000, 2000), Image.Resampling.LANCZOS)
-                    if target_ext == '.jpg':
-                        img.save(file_path, 'JPEG', optimize=True, quality=85)
-                    else:
-                        img.save(file_path, optimize=True, quality=85)
-                    logging.debug(f"Optimized large image: {file_path}")
+                # Derive each size from the previous (larger) one, largest first;
+                # sizes the image already fits in would only duplicate the original
+                source = img
+                for variant, max_size in sorted(IMAGE_DERIVATIVE_SIZES.items(), key=lambda item: -item[1]):
+                    if max_size >= max(img.width, img.height):
+                        continue
+                    derivative = source.copy()
+                    derivative.thumbnail((max_size, max_size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+                    derivative_key = self._derivative_key(key, variant)
+                    encoded = self._encode_image(derivative, target_ext, quality=85)
+                    image_files.append(self._store_image(variant, derivative_key, encoded, derivative))
+                    source = derivative
+                
+                image_files[0]['phash'] = to_signed64(dhash(source))
+                return image_files
                     
         except Exception as e:
-            logging.warning(f"Image processing failed for {file_path}: {e}")
-            if file_path.exists():
-                file_path.unlink()
+            logging.warning(f"Image processing failed for {key}: {e}")
+            if image_files:
+                self.storage.delete_many([file_info['file_path'] for file_info in image_files])
+            return None
+    
+    def _to_rgb(self, img: Image.Image) -> Image.Image:
+        """Flatten transparency onto white and convert to RGB for JPEG output."""
+        if img.mode in ('RGBA', 'LA', 'P'):
+            rgb_img = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            rgb_img.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+            return rgb_img
+        if img.mode != 'RGB':
+            return img.convert('RGB')
+        return img
     
-    def _save_post_metadata(self, post_data: Dict, folder: Path) -> Optional[Path]:
-        """Save post metadata as JSON file."""
+    def _encode_image(self, img: Image.Image, target_ext: str, quality: int) -> io.BytesIO:
+        """Encode an image in memory in the format matching its extension."""
+        buffer = io.BytesIO()
+        img.save(buffer, Image.registered_extensions()[target_ext], optimize=True, quality=quality)
+        buffer.seek(0)
+        return buffer
+    
+    def _store_image(self, variant: str, key: str, data: BinaryIO, img: Image.Image) -> Dict:
+        """Write an encoded image to storage and describe it for the database."""
+        size_bytes = data.getbuffer().nbytes
+        return {
+            'variant': variant,
+            'file_path': self.storage.write(key, data),
+            'width': img.width,
+            'height': img.height,
+            'size_bytes': size_bytes,
+        }
+    
+    def _save_post_metadata(self, post_data: Dict, folder: str, downloaded: Optional[tuple] = None) -> bool:
+        """Queue post metadata for the profile's append-only posts.jsonl.
+        
+        Lines are written in batches; call `flush_metadata` to write pending
+        ones immediately. Where each line ends up (on S3, a new segment
+        object per batch) is recorded in `post_metadata`, and the post is
+        marked downloaded with `downloaded` = (file_paths, bytes_downloaded)
+        in the same transaction.
+        """
         try:
-            metadata_file = folder / "metadata.json"
+            metadata_key = f"{folder}/metadata/posts.jsonl"
             
             metadata = {
                 'post_url': post_data['post_url'],
@@ -177,34 +317,32 @@ class FileDownloader:
                 'image_count': len(json.loads(post_data.get('image_urls', '[]'))),
             }
             
-            with open(metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, indent=2, ensure_ascii=False)
-            
-            return metadata_file
+            self.metadata_store.add(metadata_key, metadata, downloaded)
+            return True
             
         except Exception as e:
             logging.error(f"Error saving post metadata: {e}")
-            return None
+            return False
+    
+    def flush_metadata(self):
+        """Write and sync all queued post metadata."""
+        self.metadata_store.flush()
+    
+    def get_post_metadata(self, post_url: str) -> Optional[Dict]:
+        """Get the stored metadata of a downloaded post."""
+        return self.metadata_store.get(post_url)
     
     def get_download_statistics(self) -> Dict:
-        """Get download statistics."""
+        """Get download statistics for the stored image files."""
         try:
-            total_size = 0
-            file_count = 0
-            
-            for root, dirs, files in os.walk(self.downloads_folder):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    if os.path.exists(file_path):
-                        total_size += os.path.getsize(file_path)
-                        file_count += 1
+            totals = self.db.get_stored_file_totals()
             
-            total_size_mb = total_size / (1024 * 1024)
+            total_size_mb = totals['bytes'] / (1024 * 1024)
             
             return {
-                'total_files': file_count,
+                'total_files': totals['files'],
                 'total_size_mb': round(total_size_mb, 2),
-                'downloads_folder': str(self.downloads_folder)
+                'downloads_folder': self.storage.describe()
             }
             
         except Exception as e:
@@ -212,28 +350,81 @@ class FileDownloader:
             return {}
     
     def cleanup_old_downloads(self, days_to_keep: int = 30):
-        """Clean up downloads older than specified days."""
+        """Clean up downloads not used in the specified number of days."""
+        self.enforce_retention(max_age_days=days_to_keep)
+    
+    def enforce_retention(self, max_age_days: Optional[int] = None, quota_mb: Optional[float] = None,
+                          batch_size: int = 500) -> Dict:
+        """Evict stored images by age, then least recently used first until under quota.
+        
+        Candidates come from the database, so no directory walk is needed, and
+        the database is updated in step with every batch of deletions. An
+        image is always evicted together with all of its derivatives. If the
+        database cannot be updated, retention stops and the result carries an
+        `error`; the next run forgets the files already deleted.
+        """
+        removed_files = 0
+        removed_bytes = 0
+        error = None
+        
         try:
-            import time
-            from datetime import datetime, timedelta
-            
-            cutoff_date = datetime.now() - timedelta(days=days_to_keep)
-            cutoff_timestamp = cutoff_date.timestamp()
+            if max_age_days is not None:
+                cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+                while True:
+                    images = self.db.get_least_recently_used_images(batch_size, accessed_before=cutoff)
+                    evicted = self._evict_images(images)
+                    if not evicted:
+                        break
+                    removed_files += len(evicted)
+                    removed_bytes += sum(file_info['size_bytes'] or 0 for file_info in evicted)
             
-            removed_count = 0
-            for root, dirs, files in os.walk(self.downloads_folder):
-                for dir_name in dirs:
-                    dir_path = os.path.join(root, dir_name)
-                    if os.path.getmtime(dir_path) < cutoff_timestamp:
-                        import shutil
-                        shutil.rmtree(dir_path)
-                        removed_count += 1
-                        logging.info(f"Removed old download folder: {dir_path}")
+            if quota_mb is not None:
+                quota_bytes = int(quota_mb * 1024 * 1024)
+                stored_bytes = self.db.get_stored_file_totals()['bytes']
+                while stored_bytes > quota_bytes:
+                    images = self.db.get_least_recently_used_images(batch_size)
+                    # Only evict as much of this batch as the quota requires
+                    to_evict = []
+                    for image in images:
+                        if stored_bytes <= quota_bytes:
+                            break
+                        to_evict.append(image)
+                        stored_bytes -= image['size_bytes']
+                    evicted = self._evict_images(to_evict)
+                    if not evicted:
+                        break
+                    evicted_bytes = sum(file_info['size_bytes'] or 0 for file_info in evicted)
+                    # Files that could not be deleted still count against the quota
+                    stored_bytes += sum(image['size_bytes'] for image in to_evict) - evicted_bytes
+                    removed_files += len(evicted)
+                    removed_bytes += evicted_bytes
             
-            logging.info(f"Cleanup completed. Removed {removed_count} old folders.")
+            logging.info(f"Retention completed. Removed {removed_files} files "
+                         f"({removed_bytes / (1024 * 1024):.1f} MB).")
             
         except Exception as e:
             logging.error(f"Error during cleanup: {e}")
+            error = str(e)
+        
+        result = {'removed_files': removed_files, 'removed_bytes': removed_bytes}
+        if error:
+            result['error'] = error
+        return result
+    
+    def _evict_images(self, images: List[Dict]) -> List[Dict]:
+        """Delete images with all their derivatives from storage and the database.
+        
+        Returns the files evicted. Files already missing from storage are
+        forgotten as well; files that cannot be deleted stay recorded so the
+        database keeps matching storage. Raises RuntimeError if the database
+        could not be updated after the deletions.
+        """
+        files = [file_info for image in images for file_info in image['files']]
+        deleted = set(self.storage.delete_many([str(file_info['file_path']) for file_info in files]))
+        evicted = [file_info for file_info in files if str(file_info['file_path']) in deleted]
+        if not self.db.remove_post_files(evicted):
+            raise RuntimeError(f"deleted {len(evicted)} files but could not update the database")
+        return evicted
 
     def _extract_unique_id_from_url(self, img_url: str) -> str:
         """Extract unique ID from Tise image URL for filename uniqueness."""
@@ -0,0 +1,128 @@
+import csv
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from database import DatabaseManager
+
+EXPORT_COLUMNS = [
+    'post_url', 'profile_url', 'title', 'description', 'price', 'image_urls',
+    'post_date', 'scraped_date', 'is_sold', 'downloaded', 'file_paths'
+]
+
+EXPORT_FORMATS = {
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+}
+
+class PostExporter:
+    """Streams posts out of the database into JSONL, CSV or Parquet files."""
+
+    def __init__(self, db: Optional[DatabaseManager] = None, chunk_size: int = 5000):
+        self.db = db or DatabaseManager()
+        self.chunk_size = chunk_size
+
+    def export(self, output_path: str, export_format: Optional[str] = None, **filters) -> int:
+        """Export posts matching `filters` to `output_path` and return the row count.
+
+        The format is taken from the file extension unless given explicitly.
+        Accepted filters are those of `DatabaseManager.iter_posts`.
+        """
+        path = Path(output_path)
+        export_format = (export_format or EXPORT_FORMATS.get(path.suffix.lower(), '')).lower()
+
+        writers = {
+            'jsonl': self._write_jsonl,
+            'csv': self._write_csv,
+            'parquet': self._write_parquet,
+        }
+        if export_format not in writers:
+            raise ValueError(f"Unsupported export format '{export_format or path.suffix}', "
+                             f"expected one of: {', '.join(writers)}")
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        rows = self.db.iter_posts(batch_size=self.chunk_size, **filters)
+        count = writers[export_format](rows, path)
+
+        logging.info(f"Exported {count} posts to {path} ({export_format})")
+        return count
+
+    def _chunks(self, rows):
+        """Group rows into lists of at most `chunk_size` posts."""
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _normalize(self, row: Dict) -> Dict:
+        """Decode JSON columns and booleans into native values."""
+        row = dict(row)
+        row['image_urls'] = self._load_list(row.get('image_urls'))
+        row['file_paths'] = self._load_list(row.get('file_paths'))
+        row['is_sold'] = bool(row.get('is_sold'))
+        row['downloaded'] = bool(row.get('downloaded'))
+        return row
+
+    def _load_list(self, value: Optional[str]) -> List[str]:
+        """Parse a JSON list column, tolerating empty or malformed values."""
+        try:
+            return json.loads(value) if value else []
+        except (TypeError, ValueError):
+            return []
+
+    def _write_jsonl(self, rows, path: Path) -> int:
+        """Write one JSON object per line."""
+        count = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for chunk in self._chunks(rows):
+                f.write(''.join(json.dumps(self._normalize(row), ensure_ascii=False) + '\n' for row in chunk))
+                count += len(chunk)
+        return count
+
+    def _write_csv(self, rows, path: Path) -> int:
+        """Write a CSV file with list columns kept as JSON strings."""
+        count = 0
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=EXPORT_COLUMNS, extrasaction='ignore')
+            writer.writeheader()
+            for chunk in self._chunks(rows):
+                writer.writerows(chunk)
+                count += len(chunk)
+        return count
+
+    def _write_parquet(self, rows, path: Path) -> int:
+        """Write a Parquet file with one row group per chunk (requires pyarrow)."""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+
+        schema = pa.schema([
+            ('post_url', pa.string()),
+            ('profile_url', pa.string()),
+            ('title', pa.string()),
+            ('description', pa.string()),
+            ('price', pa.string()),
+            ('image_urls', pa.list_(pa.string())),
+            ('post_date', pa.string()),
+            ('scraped_date', pa.string()),
+            ('is_sold', pa.bool_()),
+            ('downloaded', pa.bool_()),
+            ('file_paths', pa.list_(pa.string())),
+        ])
+
+        count = 0
+        with pq.ParquetWriter(str(path), schema) as writer:
+            for chunk in self._chunks(rows):
+                normalized = [self._normalize(row) for row in chunk]
+                writer.write_table(pa.Table.from_pylist(normalized, schema=schema))
+                count += len(chunk)
+        return count
@@ -0,0 +1,147 @@
+import io
+import logging
+from itertools import combinations
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from database import DatabaseManager, PHASH_BAND_BITS, PHASH_BANDS
+from storage import StorageBackend, create_storage
+
+HASH_BITS = 64
+
+# Largest accepted search distance; the band lookups grow combinatorially with it
+MAX_DISTANCE = 12
+
+def dhash(img: Image.Image) -> int:
+    """Compute a 64-bit difference hash of an image.
+
+    The image is shrunk to 9x8 grayscale and each bit records whether a pixel
+    is brighter than its right-hand neighbour, which survives re-encoding and
+    resizing. Transparency is flattened onto white first, as for stored
+    JPEGs, so an image hashes the same whether it was downloaded or read
+    from a file.
+    """
+    if img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info):
+        rgba = img.convert('RGBA')
+        img = Image.alpha_composite(Image.new('RGBA', rgba.size, (255, 255, 255, 255)), rgba)
+    small = img.convert('L').resize((9, 8), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+def to_signed64(value: int) -> int:
+    """Map an unsigned 64-bit hash into SQLite's signed INTEGER range."""
+    return value - (1 << HASH_BITS) if value >= (1 << (HASH_BITS - 1)) else value
+
+def from_signed64(value: int) -> int:
+    """Inverse of `to_signed64`."""
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count('1')
+
+def band_neighbours(hash_value: int, radius: int) -> List[List[int]]:
+    """Values within `radius` bits of each 16-bit band of a hash.
+
+    Two hashes within `max_distance` bits differ by at most
+    `max_distance // 4` bits in at least one band, so looking up these
+    values finds every candidate.
+    """
+    mask = (1 << PHASH_BAND_BITS) - 1
+    bands = []
+    for band in range(len(PHASH_BANDS)):
+        value = (hash_value >> (band * PHASH_BAND_BITS)) & mask
+        values = [value]
+        for flips in range(1, radius + 1):
+            for bits in combinations(range(PHASH_BAND_BITS), flips):
+                flipped = value
+                for bit in bits:
+                    flipped ^= 1 << bit
+                values.append(flipped)
+        bands.append(values)
+    return bands
+
+class NearDuplicateIndex:
+    """Finds visually similar downloaded images across all profiles.
+
+    Lookups use SQLite indexes on the four 16-bit bands of each stored hash,
+    so a query reads only the images sharing a nearby band value instead of
+    every hash. Stored images are read through the storage backend.
+    """
+
+    def __init__(self, db: Optional[DatabaseManager] = None, storage: Optional[StorageBackend] = None):
+        self.db = db or DatabaseManager()
+        self.storage = storage or create_storage()
+
+    def backfill(self) -> int:
+        """Hash stored originals that were downloaded before hashing existed.
+
+        Images that are missing or cannot be decoded are marked so later
+        runs skip them.
+        """
+        updated = []
+        failed = []
+        file_paths = [file_info['file_path'] for file_info in self.db.get_files_missing_phash()]
+        stored = self.storage.existing(file_paths)
+        for file_path in file_paths:
+            if file_path not in stored:
+                failed.append(('missing from storage', file_path))
+                continue
+            try:
+                with Image.open(io.BytesIO(self.storage.read(file_path))) as img:
+                    img.draft('L', (64, 64))
+                    updated.append((to_signed64(dhash(img)), file_path))
+            except Exception as e:
+                logging.warning(f"Could not hash {file_path}: {e}")
+                failed.append((str(e) or type(e).__name__, file_path))
+
+        if updated or failed:
+            self.db.set_file_phashes(updated, failed)
+            logging.info(f"Backfilled perceptual hashes for {len(updated)} images ({len(failed)} failed)")
+        return len(updated)
+
+    def find_similar(self, hash_value: int, max_distance: int = 6) -> List[Dict]:
+        """Find stored images whose hash is within `max_distance` bits, closest first."""
+        if not 0 <= max_distance <= MAX_DISTANCE:
+            raise ValueError(f"max_distance must be between 0 and {MAX_DISTANCE}")
+        radius = max_distance // len(PHASH_BANDS)
+        matches = []
+        for phash, post_url, file_path in self.db.get_phash_candidates(band_neighbours(hash_value, radius)):
+            distance = hamming_distance(hash_value, from_signed64(phash))
+            if distance <= max_distance:
+                matches.append({'distance': distance, 'post_url': post_url, 'file_path': file_path})
+        matches.sort(key=lambda match: match['distance'])
+        return matches
+
+    def find_similar_to_image(self, image_path: str, max_distance: int = 6) -> List[Dict]:
+        """Find stored images similar to a stored image or a local image file."""
+        if self.storage.existing([image_path]):
+            source = io.BytesIO(self.storage.read(image_path))
+        else:
+            source = image_path
+        with Image.open(source) as img:
+            hash_value = dhash(img)
+        return [match for match in self.find_similar(hash_value, max_distance)
+                if match['file_path'] != image_path]
+
+    def find_similar_to_post(self, post_url: str, max_distance: int = 6) -> List[Dict]:
+        """Find images from other posts similar to any image of `post_url`."""
+        matches = {}
+        for file_info in self.db.get_post_files(post_url, variant='original'):
+            if file_info.get('phash') is None:
+                continue
+            for match in self.find_similar(from_signed64(file_info['phash']), max_distance):
+                if match['post_url'] == post_url:
+                    continue
+                match['source_file'] = file_info['file_path']
+                best = matches.get(match['file_path'])
+                if best is None or match['distance'] < best['distance']:
+                    matches[match['file_path']] = match
+        return sorted(matches.values(), key=lambda match: match['distance'])
@@ -0,0 +1,114 @@
+import sys
+import copy
+import json
+import time
+import queue
+import logging
+import logging.handlers
+from datetime import datetime
+from typing import Optional
+
+from config import PROGRESS_INTERVAL_SECONDS
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+class StructuredFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, including `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            'timestamp': datetime.fromtimestamp(record.created).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                event[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            event['exception'] = record.exc_text
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+class _StructuredQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that keeps the traceback apart from the message.
+
+    The stock handler folds the traceback into the message text, so
+    formatters downstream could no longer write it as its own field.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            # Send the formatted text rather than the live traceback and its frames
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class _ConsoleEventFilter(logging.Filter):
+    """Keeps routine structured events out of the console; they go to the log file."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or not hasattr(record, 'event')
+
+def setup_logging(log_filename: str, level: int = logging.INFO) -> logging.handlers.QueueListener:
+    """Route all logging through a queue so callers never block on file or console I/O.
+
+    The log file receives structured JSON lines and the console keeps the
+    human-readable format without routine `log_event` records. Returns the
+    started listener; stop it on shutdown to flush pending records.
+    """
+    file_handler = logging.FileHandler(log_filename, encoding='utf-8')
+    file_handler.setFormatter(StructuredFormatter())
+
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    console_handler.addFilter(_ConsoleEventFilter())
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_StructuredQueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener.start()
+    return listener
+
+class ProgressReporter:
+    """Console progress output limited to one line per interval.
+
+    `update` drops messages arriving sooner than `min_interval` seconds after
+    the last printed line; `done` always prints.
+    """
+
+    def __init__(self, min_interval: float = PROGRESS_INTERVAL_SECONDS):
+        self.min_interval = min_interval
+        self._last_print = 0.0
+
+    def update(self, message: str, force: bool = False):
+        """Print a progress line unless one was printed too recently."""
+        now = time.monotonic()
+        if force or now - self._last_print >= self.min_interval:
+            print(message)
+            self._last_print = now
+
+    def done(self, message: str):
+        """Print a summary line unconditionally."""
+        self.update(message, force=True)
+
+progress = ProgressReporter()
+
+def log_event(event: str, message: str, level: int = logging.INFO,
+              logger: Optional[logging.Logger] = None, **fields):
+    """Log a structured event; `fields` become JSON keys in the log file."""
+    (logger or logging.getLogger()).log(level, message, extra={'event': event, **fields})
@@ -0,0 +1,129 @@
+import os
+import sys
+import signal
+import logging
+import tracemalloc
+from typing import Dict, Optional
+
+from config import MEMORY_RSS_LIMIT_MB, MEMORY_TRACEMALLOC_FRAMES, MEMORY_REPORT_TOP
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of this process in MB, or None if it cannot be read."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    if sys.platform == 'win32':
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [
+                    ('cb', wintypes.DWORD),
+                    ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t),
+                    ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t),
+                    ('PeakPagefileUsage', ctypes.c_size_t),
+                ]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize / (1024 * 1024)
+        except Exception:
+            pass
+
+    return None
+
+class MemoryWatchdog:
+    """Tracks memory growth across monitoring cycles in long-running mode.
+
+    RSS is sampled after every cycle and compared with `rss_limit_mb`. When
+    `tracemalloc_frames` is positive, allocations are traced and each cycle
+    logs the call sites that grew most since the previous one. Sending SIGUSR1
+    (SIGBREAK on Windows) logs the current top allocators.
+    """
+
+    def __init__(self, rss_limit_mb: Optional[float] = MEMORY_RSS_LIMIT_MB,
+                 tracemalloc_frames: int = MEMORY_TRACEMALLOC_FRAMES,
+                 top_n: int = MEMORY_REPORT_TOP):
+        self.rss_limit_mb = rss_limit_mb
+        self.tracemalloc_frames = tracemalloc_frames
+        self.top_n = top_n
+        self.cycles = 0
+        self.baseline_rss_mb = None
+        self._previous_snapshot = None
+
+    def start(self):
+        """Begin tracing and install the report signal handler."""
+        if self.tracemalloc_frames > 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+            self._previous_snapshot = self._snapshot()
+
+        report_signal = getattr(signal, 'SIGUSR1', None) or getattr(signal, 'SIGBREAK', None)
+        if report_signal is not None:
+            signal.signal(report_signal, lambda signum, frame: self.report_top_allocators())
+
+        self.baseline_rss_mb = current_rss_mb()
+        logging.info(f"Memory watchdog started (RSS {self._format_mb(self.baseline_rss_mb)}, "
+                     f"limit {self._format_mb(self.rss_limit_mb)}, "
+                     f"tracemalloc {'on' if tracemalloc.is_tracing() else 'off'})")
+
+    def sample_cycle(self) -> Dict:
+        """Record memory after a cycle; `restart` is True when RSS is over the limit."""
+        self.cycles += 1
+        rss_mb = current_rss_mb()
+        growth = rss_mb - self.baseline_rss_mb if rss_mb is not None and self.baseline_rss_mb is not None else None
+        logging.info(f"Memory after cycle {self.cycles}: RSS {self._format_mb(rss_mb)}"
+                     + (f" ({growth:+.1f} MB since start)" if growth is not None else ""),
+                     extra={'event': 'memory_sample', 'cycle': self.cycles, 'rss_mb': rss_mb})
+
+        if tracemalloc.is_tracing():
+            snapshot = self._snapshot()
+            if self._previous_snapshot is not None:
+                for stat in snapshot.compare_to(self._previous_snapshot, 'lineno')[:self.top_n]:
+                    if stat.size_diff > 0:
+                        logging.info(f"  Memory growth: {stat}")
+            self._previous_snapshot = snapshot
+
+        restart = self.rss_limit_mb is not None and rss_mb is not None and rss_mb > self.rss_limit_mb
+        if restart:
+            logging.warning(f"RSS {rss_mb:.1f} MB exceeds limit of {self.rss_limit_mb} MB")
+        return {'rss_mb': rss_mb, 'restart': restart}
+
+    def report_top_allocators(self):
+        """Log the call sites currently holding the most traced memory."""
+        logging.info(f"Memory report: RSS {self._format_mb(current_rss_mb())}")
+        if not tracemalloc.is_tracing():
+            logging.info("  tracemalloc is off; set MEMORY_TRACEMALLOC_FRAMES to see allocators")
+            return
+        for stat in self._snapshot().statistics('lineno')[:self.top_n]:
+            logging.info(f"  {stat}")
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        """Take a snapshot without tracemalloc's own and import-machinery allocations."""
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ))
+
+    def _format_mb(self, value: Optional[float]) -> str:
+        """Format a size in MB for log messages."""
+        return f"{value:.1f} MB" if value is not None else "n/a"
@@ -0,0 +1,98 @@
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from config import METADATA_BATCH_SIZE
+from database import DatabaseManager
+from storage import StorageBackend, create_storage
+
+class MetadataStore:
+    """Append-only JSONL metadata files with a byte-offset index in the database.
+
+    Each profile has one `posts.jsonl` key holding a line per downloaded post.
+    Lines are buffered and appended in batches: every file in a batch is
+    appended durably through the storage backend, then all offsets are
+    recorded in one transaction. If any step fails the appends are rolled
+    back and the lines are queued again, so a batch is either fully stored
+    and indexed or kept for the next flush. Posts queued with their download
+    results are marked downloaded in that same transaction, so a post is
+    never marked before its metadata is durable.
+    """
+
+    def __init__(self, db: Optional[DatabaseManager] = None, storage: Optional[StorageBackend] = None,
+                 batch_size: int = METADATA_BATCH_SIZE):
+        self.db = db or DatabaseManager()
+        self.storage = storage or create_storage()
+        self.batch_size = batch_size
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: str, metadata: Dict, downloaded: Optional[Tuple[List[str], int]] = None):
+        """Queue a post's metadata for the file at `key`, flushing once a batch is full.
+        
+        `downloaded` holds the post's (file_paths, bytes_downloaded) if it
+        should be marked downloaded once the line is stored.
+        """
+        line = (json.dumps(metadata, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._lock:
+            self._pending.setdefault(key, []).append((metadata['post_url'], line, downloaded))
+            if sum(len(lines) for lines in self._pending.values()) < self.batch_size:
+                return
+        self.flush()
+
+    def flush(self) -> int:
+        """Append all queued lines and index them; returns the number stored."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        appended = []  # (location, offset) of every append in this batch
+        locations = []
+        downloads = {}
+        try:
+            for key, lines in pending.items():
+                location, offset = self.storage.append(key, b''.join(line for _, line, _ in lines))
+                appended.append((location, offset))
+                for post_url, line, downloaded in lines:
+                    locations.append((post_url, location, offset, len(line)))
+                    offset += len(line)
+                    if downloaded is not None:
+                        downloads[post_url] = downloaded
+
+            if not self.db.add_post_metadata_locations(locations, downloads):
+                raise RuntimeError("metadata index update failed")
+            return len(locations)
+
+        except Exception as e:
+            logging.error(f"Error storing metadata for {sum(len(lines) for lines in pending.values())} posts: {e}")
+            for location, offset in appended:
+                try:
+                    self.storage.rollback_append(location, offset)
+                except Exception as rollback_error:
+                    logging.error(f"Could not roll back {location}: {rollback_error}")
+            # Requeue the batch ahead of anything added since
+            with self._lock:
+                for key, lines in self._pending.items():
+                    pending.setdefault(key, []).extend(lines)
+                self._pending = pending
+            return 0
+
+    def get(self, post_url: str) -> Optional[Dict]:
+        """Read a post's metadata, including posts still waiting to be flushed."""
+        with self._lock:
+            for lines in self._pending.values():
+                for pending_url, line, _ in reversed(lines):
+                    if pending_url == post_url:
+                        return json.loads(line)
+
+        location = self.db.get_post_metadata_location(post_url)
+        if not location:
+            return None
+        try:
+            return json.loads(self.storage.read(location['file_path'], location['byte_offset'],
+                                                location['byte_length']))
+        except Exception as e:
+            logging.error(f"Error reading metadata for {post_url}: {e}")
+            return None
@@ -0,0 +1,57 @@
+import re
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+PROFILE_URL_TEMPLATE = "https://tise.com/profiles/{username}"
+
+_USERNAME_PATTERN = re.compile(r'^[A-Za-z0-9._-]+$')
+_SEPARATORS = re.compile(r'[\s,;]+')
+
+def parse_profile(value: str) -> Optional[Tuple[str, str]]:
+    """Turn a profile URL, `@username` or bare username into (profile_url, username).
+
+    URLs keep their path but lose query strings, fragments and trailing
+    slashes; bare usernames get the standard profile URL. Usernames are
+    case-insensitive, so the username returned is lowercased. Returns None
+    for values that do not look like a profile.
+    """
+    value = value.strip()
+    if not value or value.startswith('#'):
+        return None
+
+    if '://' in value or value.startswith('tise.com/'):
+        parsed = urlparse(value if '://' in value else f"https://{value}")
+        path = parsed.path.rstrip('/')
+        username = path.split('/')[-1] if path else ''
+        if not _USERNAME_PATTERN.match(username):
+            return None
+        return f"{parsed.scheme}://{parsed.netloc}{path}", username.lower()
+
+    username = value.lstrip('@').lower()
+    if not _USERNAME_PATTERN.match(username):
+        return None
+    return PROFILE_URL_TEMPLATE.format(username=username), username
+
+def read_profiles(lines: Iterable[str]) -> Tuple[List[Tuple[str, str]], int]:
+    """Parse and de-duplicate profiles from lines of text.
+
+    Lines may hold several entries separated by whitespace, commas or
+    semicolons; `#` starts a comment. Profiles are unique by username,
+    ignoring case. Returns the unique (profile_url, username) pairs in input
+    order and the number of entries rejected.
+    """
+    profiles = []
+    seen = set()
+    rejected = 0
+    for line in lines:
+        line = line.split('#', 1)[0]
+        for token in _SEPARATORS.split(line):
+            if not token:
+                continue
+            profile = parse_profile(token)
+            if profile is None:
+                rejected += 1
+            elif profile[1] not in seen:
+                seen.add(profile[1])
+                profiles.append(profile)
+    return profiles, rejected
@@ -6,21 +6,32 @@ import json
 from typing import List, Dict, Optional
 from datetime import datetime
 
-from config import REQUEST_DELAY_SECONDS, MAX_RETRIES
+from config import REQUEST_DELAY_SECONDS, MAX_RETRIES, WATCH_OUTBOX_FILE
 from database import DatabaseManager
+from log_utils import progress
+from transport import HttpTransport, get_shared_transport, DEFAULT_USER_AGENT
+from watch_rules import WatchRuleEngine
+
+class ScrapeError(Exception):
+    """A profile could not be checked, as opposed to having no new posts."""
 
 class TiseScraper:
     """API-based scraper class for Tise.com profiles."""
     
-    def __init__(self):
+    def __init__(self, transport: Optional[HttpTransport] = None):
         self.db = DatabaseManager()
-        self.session = requests.Session()
-        self._setup_session()
+        self.transport = transport or get_shared_transport()
+        self.headers = {}
+        self.last_error = None
+        self.last_error_permanent = False
+        self._watch_rules = None
+        self._watch_rules_version = None
+        self._setup_headers()
         
-    def _setup_session(self):
-        """Setup requests session with proper headers for Tise API."""
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    def _setup_headers(self):
+        """Setup request headers for the Tise API."""
+        self.headers.update({
+            'User-Agent': DEFAULT_USER_AGENT,
             'Accept': 'application/json, text/plain, */*',
             'Accept-Language': 'en,en;q=0.9',
             'sec-ch-ua-platform': '"Windows"',
@@ -29,19 +40,37 @@ class TiseScraper:
         })
     
     def _make_request(self, url: str) -> Optional[requests.Response]:
-        """Make HTTP request with retry logic."""
+        """Make HTTP request with retry logic.
+        
+        Client errors other than 429 are not retried. On failure the reason is
+        left in `last_error`, and `last_error_permanent` is set when the
+        resource is gone (404/410).
+        """
+        self.last_error = None
+        self.last_error_permanent = False
+        
         for attempt in range(MAX_RETRIES):
             try:
-                response = self.session.get(url, timeout=30)
+                response = self.transport.get(url, headers=self.headers)
                 response.raise_for_status()
                 
-                time.sleep(REQUEST_DELAY_SECONDS + random.uniform(0, 1))
+                if self.transport.politeness_delay:
+                    time.sleep(REQUEST_DELAY_SECONDS + random.uniform(0, 1))
                 return response
                 
             except requests.RequestException as e:
+                self.last_error = str(e)
+                status = e.response.status_code if e.response is not None else None
+                if status is not None and 400 <= status < 500 and status != 429:
+                    self.last_error = f"HTTP {status}"
+                    self.last_error_permanent = status in (404, 410)
+                    logging.warning(f"Request failed for {url}: {e}")
+                    return None
+                
                 logging.warning(f"Request attempt {attempt + 1} failed for {url}: {e}")
                 if attempt < MAX_RETRIES - 1:
-                    time.sleep(2 ** attempt)
+                    if self.transport.politeness_delay:
+                        time.sleep(2 ** attempt)
                 else:
                     logging.error(f"All request attempts failed for {url}")
                     return None
@@ -50,7 +79,7 @@ class TiseScraper:
         """Get internal user ID from username using Tise API."""
         try:
             # Update referer for this specific profile
-            self.session.headers['Referer'] = f'https://tise.com/{username}'
+            self.headers['Referer'] = f'https://tise.com/{username}'
             
             api_url = f"https://tise.com/api/users/{username}"
             response = self._make_request(api_url)
@@ -64,18 +93,25 @@ class TiseScraper:
                     logging.info(f"Found user ID {user_id} for username {username}")
                     return user_id
                 else:
+                    self.last_error = "No user ID in API response"
+                    self.last_error_permanent = True
                     logging.error(f"No user ID found in API response for {username}")
                     logging.debug(f"API response structure: {list(data.keys())}")
             else:
-                logging.error(f"Failed to get user info for {username}: Status {response.status_code if response else 'No response'}")
+                logging.error(f"Failed to get user info for {username}: {self.last_error or 'No response'}")
                 
         except Exception as e:
+            self.last_error = str(e)
             logging.error(f"Error getting user ID for {username}: {e}")
         
         return None
     
     def scrape_profile_posts(self, profile_url: str) -> List[Dict]:
-        """Scrape posts from a Tise profile using the API."""
+        """Scrape posts from a Tise profile using the API.
+        
+        Raises ScrapeError when the profile or its first page of posts cannot
+        be fetched; later pages that fail leave a partial result.
+        """
         # Extract username from URL
         username = profile_url.rstrip('/').split('/')[-1]
         logging.info(f"Scraping profile: {username}")
@@ -85,7 +121,11 @@ class TiseScraper:
             user_id = self.get_user_id_from_username(username)
             if not user_id:
                 logging.error(f"Could not get user ID for {username}")
-                return []
+                self.db.record_profile_failure(
+                    profile_url, self.last_error or "User lookup failed", permanent=self.last_error_permanent
+                )
+                raise ScrapeError(f"Could not get user ID for {username}: {self.last_error or 'User lookup failed'}")
+            self.db.record_profile_success(profile_url)
             
             # Get posts using the API with pagination
             all_posts = []
@@ -94,11 +134,15 @@ class TiseScraper:
             max_pages = 10  # Safety limit to prevent infinite loops
             
             while next_url and page_count < max_pages:
-                print(f"      📄 Fetching page {page_count + 1}...")
+                progress.update(f"      📄 Fetching page {page_count + 1}...")
                 response = self._make_request(next_url)
                 
                 if not response or response.status_code != 200:
                     logging.error(f"Failed to get posts page {page_count + 1} for user {username}")
+                    if page_count == 0:
+                        reason = self.last_error or "Posts request failed"
+                        self.db.record_profile_failure(profile_url, reason)
+                        raise ScrapeError(f"Could not get posts for {username}: {reason}")
                     break
                 
                 data = response.json()
@@ -117,9 +161,8 @@ class TiseScraper:
                     next_url = None
                     
                 page_count += 1
-                print(f"        ✅ Found {len(page_posts)} posts on page {page_count}")
             
-            print(f"      📊 Total posts from {page_count} pages: {len(all_posts)}")
+            progress.update(f"      📊 Total posts from {page_count} pages: {len(all_posts)}")
             
             # Convert API data to our standard format
             posts = []
@@ -131,9 +174,11 @@ class TiseScraper:
             logging.info(f"Found {len(posts)} posts across {page_count} pages for {username}")
             return posts
             
+        except ScrapeError:
+            raise
         except Exception as e:
             logging.error(f"Error scraping profile {profile_url}: {e}")
-            return []
+            raise ScrapeError(f"Error scraping profile {profile_url}: {e}") from e
     
     def _process_api_post(self, api_post: Dict, profile_url: str) -> Optional[Dict]:
         """Convert API post data to our standard format."""
@@ -164,6 +209,7 @@ class TiseScraper:
                 'title': api_post.get('title', ''),
                 'description': api_post.get('caption', ''),
                 'price': f"{price_nok:.0f} NOK" if price_nok > 0 else "Not specified",
+                'price_nok': round(price_nok) if price_nok > 0 else None,
                 'image_urls': json.dumps(image_urls),
                 'scraped_date': datetime.now().isoformat(),
                 'created_date': api_post.get('createdAt', ''),
@@ -196,30 +242,96 @@ class TiseScraper:
         return 'No colors specified'
     
     def check_for_new_posts(self, profile_url: str) -> List[Dict]:
-        """Check for new posts that haven't been downloaded yet."""
+        """Check for new posts that haven't been downloaded yet.
+        
+        Posts found before whose download never completed (for instance
+        because the process stopped before their metadata was flushed) are
+        returned again after the new ones. Raises ScrapeError when the profile
+        could not be checked.
+        """
         try:
             all_posts = self.scrape_profile_posts(profile_url)
             new_posts = []
+            retry_posts = []
+            seen_posts = []
             
             for post in all_posts:
-                if not self.db.post_exists(post['post_url']):
+                downloaded = self.db.is_post_downloaded(post['post_url'])
+                if downloaded is None:
                     new_posts.append(post)
                     # Add to database as discovered
                     self.db.add_post(post)
+                else:
+                    seen_posts.append(post)
+                    if not downloaded:
+                        retry_posts.append(post)
+            
+            # Posts still listed keep their files fresh for retention and their sold status current
+            self.db.update_seen_posts(seen_posts)
             
-            if new_posts:
-                logging.info(f"Found {len(new_posts)} new posts from {profile_url}")
+            if new_posts or retry_posts:
+                logging.info(f"Found {len(new_posts)} new posts and {len(retry_posts)} to retry from {profile_url}")
             else:
                 logging.info(f"No new posts found from {profile_url}")
             
-            return new_posts
-            
+        except ScrapeError:
+            raise
         except Exception as e:
             logging.error(f"Error checking for new posts from {profile_url}: {e}")
-            return []
+            raise ScrapeError(f"Error checking for new posts from {profile_url}: {e}") from e
+        
+        # Rule problems must not hide the new posts found above
+        self._match_watch_rules(new_posts)
+        return new_posts + retry_posts
+    
+    def _match_watch_rules(self, posts: List[Dict]):
+        """Match new posts against the watch rules and queue the matches."""
+        if not posts:
+            return
+        try:
+            watch_rules = self._get_watch_rules()
+            watch_matches = [
+                (rule_id, post['post_url'])
+                for post in posts
+                for rule_id in watch_rules.match(post)
+            ]
+            if watch_matches:
+                self._queue_watch_matches(watch_matches, watch_rules, posts)
+        except Exception as e:
+            logging.error(f"Error matching watch rules: {e}")
+    
+    def _get_watch_rules(self) -> WatchRuleEngine:
+        """Return the compiled watch rules, recompiling only when they changed."""
+        version = self.db.get_watch_rules_version()
+        if self._watch_rules is None or version != self._watch_rules_version:
+            self._watch_rules = WatchRuleEngine(self.db.get_watch_rules())
+            self._watch_rules_version = version
+            logging.info(f"Compiled {len(self._watch_rules)} watch rules")
+        return self._watch_rules
+    
+    def _queue_watch_matches(self, matches: List[tuple], watch_rules: WatchRuleEngine, posts: List[Dict]):
+        """Write rule matches to the outbox table and, if configured, the outbox file."""
+        added = self.db.add_watch_matches(matches)
+        logging.info(f"Queued {added} watch rule matches")
+        
+        if WATCH_OUTBOX_FILE and added:
+            posts_by_url = {post['post_url']: post for post in posts}
+            try:
+                with open(WATCH_OUTBOX_FILE, 'a', encoding='utf-8') as f:
+                    for rule_id, post_url in matches:
+                        post = posts_by_url[post_url]
+                        f.write(json.dumps({
+                            'rule_id': rule_id,
+                            'rule_name': watch_rules.names.get(rule_id),
+                            'post_url': post_url,
+                            'title': post.get('title'),
+                            'price': post.get('price'),
+                            'matched_date': datetime.now().isoformat(),
+                        }, ensure_ascii=False) + '\n')
+            except OSError as e:
+                logging.error(f"Error writing watch outbox file: {e}")
     
     def close(self):
         """Clean up resources."""
-        if hasattr(self, 'session'):
-            self.session.close()
+        self.db.flush_logs()
         logging.info("TiseScraper closed")
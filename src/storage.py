@@ -0,0 +1,288 @@
+import os
+import uuid
+import shutil
+import logging
+import posixpath
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+from config import (
+    DOWNLOADS_FOLDER,
+    STORAGE_BACKEND,
+    S3_BUCKET,
+    S3_PREFIX,
+    S3_ENDPOINT_URL,
+    S3_REGION,
+    S3_MULTIPART_CHUNK_MB,
+    S3_MAX_CONCURRENT_REQUESTS
+)
+
+class StorageBackend(ABC):
+    """Where downloaded images and metadata are kept.
+
+    Files are written under '/'-separated keys such as
+    `username/images/image_1_ab12cd34.jpg`. Each write returns a location
+    string, which is what the database records and what `read` and
+    `delete_many` accept later.
+    """
+
+    @abstractmethod
+    def location(self, key: str) -> str:
+        """The location a file written under `key` gets."""
+
+    @abstractmethod
+    def write(self, key: str, fileobj: BinaryIO) -> str:
+        """Store the contents of a binary stream under `key` and return its location."""
+
+    @abstractmethod
+    def append(self, key: str, data: bytes) -> Tuple[str, int]:
+        """Durably append `data` for `key`, returning the location and offset written to."""
+
+    @abstractmethod
+    def rollback_append(self, location: str, offset: int):
+        """Undo an `append` that returned (location, offset)."""
+
+    @abstractmethod
+    def read(self, location: str, offset: int = 0, length: Optional[int] = None) -> bytes:
+        """Read a whole file or a byte range of it."""
+
+    @abstractmethod
+    def existing(self, locations: Iterable[str]) -> Dict[str, int]:
+        """Map those of `locations` that exist to their sizes in bytes."""
+
+    @abstractmethod
+    def list_prefixes(self, prefixes: Iterable[str]) -> Dict[str, int]:
+        """Map the locations of all files whose key starts with one of `prefixes` to their sizes."""
+
+    @abstractmethod
+    def delete_many(self, locations: List[str]) -> List[str]:
+        """Delete files, returning the locations that are now gone.
+
+        Files that were already missing count as deleted; files that could
+        not be deleted are left out.
+        """
+
+    @abstractmethod
+    def describe(self) -> str:
+        """Human-readable root of the storage."""
+
+class LocalStorage(StorageBackend):
+    """Files on the local filesystem below a root folder."""
+
+    def __init__(self, root: str = DOWNLOADS_FOLDER):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def location(self, key: str) -> str:
+        return str(self.root / key)
+
+    def write(self, key: str, fileobj: BinaryIO) -> str:
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write next to the target and rename, so readers never see a partial file
+        partial_path = path.with_name(path.name + '.part')
+        with open(partial_path, 'wb') as f:
+            shutil.copyfileobj(fileobj, f)
+        os.replace(partial_path, path)
+        return str(path)
+
+    def append(self, key: str, data: bytes) -> Tuple[str, int]:
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'ab') as f:
+            offset = f.seek(0, os.SEEK_END)
+            try:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            except OSError:
+                f.truncate(offset)
+                raise
+        return str(path), offset
+
+    def rollback_append(self, location: str, offset: int):
+        with open(location, 'r+b') as f:
+            f.truncate(offset)
+
+    def read(self, location: str, offset: int = 0, length: Optional[int] = None) -> bytes:
+        with open(location, 'rb') as f:
+            f.seek(offset)
+            return f.read() if length is None else f.read(length)
+
+    def existing(self, locations: Iterable[str]) -> Dict[str, int]:
+        sizes = {}
+        for location in locations:
+            try:
+                sizes[location] = Path(location).stat().st_size
+            except OSError:
+                pass
+        return sizes
+
+    def list_prefixes(self, prefixes: Iterable[str]) -> Dict[str, int]:
+        # Scan each folder once, however many prefixes point into it
+        names_by_folder = {}
+        for prefix in prefixes:
+            path = self.root / prefix
+            names_by_folder.setdefault(path.parent, []).append(path.name)
+        sizes = {}
+        for folder, names in names_by_folder.items():
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.startswith(tuple(names)) and not entry.name.endswith('.part'):
+                    try:
+                        sizes[str(folder / entry.name)] = entry.stat().st_size
+                    except OSError:
+                        pass
+        return sizes
+
+    def delete_many(self, locations: List[str]) -> List[str]:
+        deleted = []
+        for location in locations:
+            try:
+                Path(location).unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning(f"Could not remove {location}: {e}")
+                continue
+            deleted.append(location)
+        return deleted
+
+    def describe(self) -> str:
+        return str(self.root)
+
+class S3Storage(StorageBackend):
+    """Objects in an S3-compatible bucket such as AWS S3 or MinIO (requires boto3).
+
+    Uploads go through boto3's managed transfer, which switches to multipart
+    uploads above one chunk. Objects cannot be appended to, so each `append`
+    writes a new segment object next to the key. Existence checks send a
+    HEAD request per exact key and listings one request per narrow prefix,
+    up to `max_concurrency` at a time, so their cost does not grow with the
+    bucket.
+    """
+
+    def __init__(self, bucket: str, prefix: str = '', endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, multipart_chunk_mb: int = S3_MULTIPART_CHUNK_MB,
+                 max_concurrency: int = S3_MAX_CONCURRENT_REQUESTS):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+        except ImportError:
+            raise RuntimeError("S3 storage requires boto3 (pip install boto3)")
+
+        if not bucket:
+            raise ValueError("S3 storage requires S3_BUCKET")
+
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region)
+        chunk_size = multipart_chunk_mb * 1024 * 1024
+        self.transfer_config = TransferConfig(multipart_threshold=chunk_size, multipart_chunksize=chunk_size)
+        self.max_concurrency = max_concurrency
+
+    def _object_key(self, key: str) -> str:
+        """Bucket key for a storage key."""
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def _location_key(self, location: str) -> str:
+        """Bucket key for a location returned by this backend."""
+        bucket_url = f"s3://{self.bucket}/"
+        return location[len(bucket_url):] if location.startswith(bucket_url) else location
+
+    def location(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self._object_key(key)}"
+
+    def write(self, key: str, fileobj: BinaryIO) -> str:
+        self.client.upload_fileobj(fileobj, self.bucket, self._object_key(key), Config=self.transfer_config)
+        return self.location(key)
+
+    def append(self, key: str, data: bytes) -> Tuple[str, int]:
+        stem, ext = posixpath.splitext(key)
+        segment_key = f"{stem}.{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}{ext}"
+        self.client.put_object(Bucket=self.bucket, Key=self._object_key(segment_key), Body=data)
+        return self.location(segment_key), 0
+
+    def rollback_append(self, location: str, offset: int):
+        self.client.delete_object(Bucket=self.bucket, Key=self._location_key(location))
+
+    def read(self, location: str, offset: int = 0, length: Optional[int] = None) -> bytes:
+        kwargs = {'Bucket': self.bucket, 'Key': self._location_key(location)}
+        if offset or length is not None:
+            end = '' if length is None else offset + length - 1
+            kwargs['Range'] = f"bytes={offset}-{end}"
+        return self.client.get_object(**kwargs)['Body'].read()
+
+    def _map_concurrently(self, func, items: List) -> List:
+        """Apply `func` to each item with up to `max_concurrency` requests in flight."""
+        if len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(items))) as executor:
+            return list(executor.map(func, items))
+
+    def _object_size(self, location: str) -> Optional[int]:
+        """Size of the object at `location`, or None if it does not exist."""
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self._location_key(location))
+        except self.client.exceptions.ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return response['ContentLength']
+
+    def _list_prefix(self, prefix: str) -> Dict[str, int]:
+        """Locations and sizes of the objects below one key prefix."""
+        sizes = {}
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._object_key(prefix)):
+            for obj in page.get('Contents', []):
+                sizes[f"s3://{self.bucket}/{obj['Key']}"] = obj['Size']
+        return sizes
+
+    def existing(self, locations: Iterable[str]) -> Dict[str, int]:
+        locations = list(locations)
+        sizes = self._map_concurrently(self._object_size, locations)
+        return {location: size for location, size in zip(locations, sizes) if size is not None}
+
+    def list_prefixes(self, prefixes: Iterable[str]) -> Dict[str, int]:
+        sizes = {}
+        for listed in self._map_concurrently(self._list_prefix, list(prefixes)):
+            sizes.update(listed)
+        return sizes
+
+    def delete_many(self, locations: List[str]) -> List[str]:
+        deleted = []
+        for start in range(0, len(locations), 1000):
+            batch = locations[start:start + 1000]
+            keys = {self._location_key(location): location for location in batch}
+            try:
+                response = self.client.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True}
+                )
+            except Exception as e:
+                logging.warning(f"Could not delete {len(batch)} objects: {e}")
+                continue
+            failed = set()
+            for error in response.get('Errors', []):
+                logging.warning(f"Could not remove s3://{self.bucket}/{error['Key']}: {error.get('Message')}")
+                failed.add(error['Key'])
+            deleted.extend(location for key, location in keys.items() if key not in failed)
+        return deleted
+
+    def describe(self) -> str:
+        return self.location('').rstrip('/')
+
+def create_storage() -> StorageBackend:
+    """Create the storage backend selected by STORAGE_BACKEND."""
+    if STORAGE_BACKEND == 'local':
+        return LocalStorage()
+    if STORAGE_BACKEND == 's3':
+        return S3Storage(S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL, S3_REGION)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
@@ -0,0 +1,222 @@
+import time
+import socket
+import logging
+import threading
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool, PoolManager
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+
+from config import (
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAXSIZE,
+    HTTP_POOL_MAXSIZE_PER_HOST,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    DNS_CACHE_TTL_SECONDS
+)
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+class DnsCache:
+    """Caches `socket.getaddrinfo` results for a fixed time to live."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        """`socket.getaddrinfo`, answered from the cache while an entry is fresh."""
+        key = (host, port, family, type, proto, flags)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+
+        result = socket.getaddrinfo(host, port, family, type, proto, flags)
+        with self._lock:
+            self._entries[key] = (now + self.ttl, result)
+            self.misses += 1
+        return result
+
+class _CachedDnsConnectionMixin:
+    """Resolves the host through the transport's DnsCache before connecting.
+
+    Only connections of the transport's own pools use the cache; other
+    libraries keep the normal resolver.
+    """
+
+    def __init__(self, *args, dns_cache: Optional[DnsCache] = None, **kwargs):
+        self.dns_cache = dns_cache
+        super().__init__(*args, **kwargs)
+
+    def _new_conn(self):
+        if self.dns_cache is None:
+            return super()._new_conn()
+        try:
+            addresses = self.dns_cache.getaddrinfo(self._dns_host, self.port, allowed_gai_family(), socket.SOCK_STREAM)
+        except socket.gaierror:
+            # Let urllib3 resolve again and report the failure its own way
+            return super()._new_conn()
+
+        # Connect to the cached addresses in order; the host name is still used for TLS
+        dns_host = self._dns_host
+        error = None
+        try:
+            for *_, sockaddr in addresses:
+                self._dns_host = sockaddr[0]
+                try:
+                    return super()._new_conn()
+                except (ConnectTimeoutError, NewConnectionError) as e:
+                    error = e
+        finally:
+            self._dns_host = dns_host
+        if error is None:
+            return super()._new_conn()
+        raise error
+
+class _CachedDnsHTTPConnection(_CachedDnsConnectionMixin, HTTPConnection):
+    pass
+
+class _CachedDnsHTTPSConnection(_CachedDnsConnectionMixin, HTTPSConnection):
+    pass
+
+class _CachedDnsHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CachedDnsHTTPConnection
+
+class _CachedDnsHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CachedDnsHTTPSConnection
+
+class _HostLimitedPoolManager(PoolManager):
+    """PoolManager that applies per-host pool sizes and remembers every pool it creates.
+
+    Its connections resolve host names through `dns_cache` when one is given.
+    """
+
+    def __init__(self, *args, host_maxsize: Optional[Dict[str, int]] = None,
+                 dns_cache: Optional[DnsCache] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.host_maxsize = host_maxsize or {}
+        self.dns_cache = dns_cache
+        self.pool_classes_by_scheme = {'http': _CachedDnsHTTPConnectionPool, 'https': _CachedDnsHTTPSConnectionPool}
+        self.pools_by_host = {}
+        self._pools_lock = threading.Lock()
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        if request_context is None:
+            request_context = self.connection_pool_kw.copy()
+        if host in self.host_maxsize:
+            request_context = dict(request_context, maxsize=self.host_maxsize[host])
+        # Passed on to each connection; added after the pool key is computed
+        request_context = dict(request_context, dns_cache=self.dns_cache)
+        pool = super()._new_pool(scheme, host, port, request_context)
+        # Pools can be evicted from the manager, so keep them for reuse counts
+        with self._pools_lock:
+            self.pools_by_host.setdefault(host, []).append(pool)
+        return pool
+
+class _PooledAdapter(HTTPAdapter):
+    """HTTPAdapter using `_HostLimitedPoolManager`."""
+
+    def __init__(self, host_maxsize: Optional[Dict[str, int]] = None, dns_cache: Optional[DnsCache] = None,
+                 **kwargs):
+        self.host_maxsize = host_maxsize or {}
+        self.dns_cache = dns_cache
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = _HostLimitedPoolManager(
+            num_pools=connections, maxsize=maxsize, block=block,
+            host_maxsize=self.host_maxsize, dns_cache=self.dns_cache, **pool_kwargs
+        )
+
+class HttpTransport:
+    """Shared HTTP client for API calls and image downloads.
+
+    One session with keep-alive connection pools per host, split connect/read
+    timeouts and a DNS cache used only by the transport's own connections. Retries are left to callers, who
+    should honour `politeness_delay` before pausing between requests.
+    """
+
+    politeness_delay = True
+
+    def __init__(self, pool_connections: int = HTTP_POOL_CONNECTIONS,
+                 pool_maxsize: int = HTTP_POOL_MAXSIZE,
+                 host_maxsize: Optional[Dict[str, int]] = None,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+                 read_timeout: float = HTTP_READ_TIMEOUT,
+                 dns_cache_ttl: float = DNS_CACHE_TTL_SECONDS):
+        self.timeout = (connect_timeout, read_timeout)
+        self.dns_cache = DnsCache(dns_cache_ttl) if dns_cache_ttl > 0 else None
+
+        self.adapter = _PooledAdapter(
+            host_maxsize=HTTP_POOL_MAXSIZE_PER_HOST if host_maxsize is None else host_maxsize,
+            dns_cache=self.dns_cache,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=0
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.session.headers['User-Agent'] = DEFAULT_USER_AGENT
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None, stream: bool = False,
+            timeout=None) -> requests.Response:
+        """Send a GET request over the pooled session."""
+        return self.session.get(url, headers=headers, stream=stream, timeout=timeout or self.timeout)
+
+    def connection_stats(self) -> Dict[str, Dict[str, int]]:
+        """Requests, new connections and reused connections per host."""
+        stats = {}
+        manager = self.adapter.poolmanager
+        with manager._pools_lock:
+            pools_by_host = {host: list(pools) for host, pools in manager.pools_by_host.items()}
+
+        for host, pools in pools_by_host.items():
+            requests_sent = sum(pool.num_requests for pool in pools)
+            connections = sum(pool.num_connections for pool in pools)
+            stats[host] = {
+                'requests': requests_sent,
+                'connections': connections,
+                'reused': max(requests_sent - connections, 0),
+            }
+        return stats
+
+    def log_stats(self):
+        """Log connection reuse per host and DNS cache effectiveness."""
+        for host, host_stats in self.connection_stats().items():
+            logging.info(f"HTTP {host}: {host_stats['requests']} requests over "
+                         f"{host_stats['connections']} connections ({host_stats['reused']} reused)")
+        if self.dns_cache:
+            logging.info(f"DNS cache: {self.dns_cache.hits} hits, {self.dns_cache.misses} lookups")
+
+    def close(self):
+        """Close all pooled connections."""
+        self.session.close()
+
+_shared_transport: Optional[HttpTransport] = None
+
+def get_shared_transport() -> HttpTransport:
+    """Return the process-wide transport, creating it on first use."""
+    global _shared_transport
+    if _shared_transport is None:
+        _shared_transport = HttpTransport()
+    return _shared_transport
+
+def set_shared_transport(transport):
+    """Replace the process-wide transport, e.g. with a recording or replaying one."""
+    global _shared_transport
+    _shared_transport = transport
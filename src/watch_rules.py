@@ -0,0 +1,204 @@
+import json
+from collections import Counter, deque
+from typing import Dict, Iterable, List, Set, Tuple
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton finding every keyword in a text in one pass.
+
+    Keywords only match as whole words: the characters on either side of a
+    hit must not be letters or digits. Matching cost depends on the text
+    length and the number of hits, not on how many keywords were added.
+    """
+
+    def __init__(self, keywords: Dict[str, Set[int]]):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [{}]  # keyword length -> rule ids, for keywords ending in this state
+
+        for keyword, rule_ids in keywords.items():
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append({})
+                    self._goto[state][char] = next_state
+                state = next_state
+            self._output[state].setdefault(len(keyword), set()).update(rule_ids)
+
+        # Breadth-first pass to compute failure links and merge outputs
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                for length, rule_ids in self._output[self._fail[next_state]].items():
+                    self._output[next_state].setdefault(length, set()).update(rule_ids)
+
+    def match(self, text: str) -> Set[int]:
+        """Return the ids of all rules with a keyword occurring as a whole word in `text`."""
+        matched = set()
+        state = 0
+        goto, fail, output = self._goto, self._fail, self._output
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state] and not (end + 1 < len(text) and text[end + 1].isalnum()):
+                for length, rule_ids in output[state].items():
+                    start = end - length + 1
+                    if start == 0 or not text[start - 1].isalnum():
+                        matched |= rule_ids
+        return matched
+
+class PriceIntervalIndex:
+    """Static centred interval tree answering "which ranges contain this price"."""
+
+    def __init__(self, intervals: List[Tuple[float, float, int]]):
+        # Inverted ranges would never contain the centre point, so normalise them
+        self._root = self._build([(min(start, end), max(start, end), rule_id) for start, end, rule_id in intervals])
+
+    def _build(self, intervals):
+        if not intervals:
+            return None
+        endpoints = sorted(point for start, end, _ in intervals for point in (start, end))
+        center = endpoints[len(endpoints) // 2]
+
+        left = [interval for interval in intervals if interval[1] < center]
+        right = [interval for interval in intervals if interval[0] > center]
+        overlapping = [interval for interval in intervals if interval[0] <= center <= interval[1]]
+
+        if not overlapping:
+            # Degenerate split (e.g. NaN bounds): keep the rest for a linear scan
+            return {'center': center, 'by_start': [], 'by_end': [], 'scan': intervals,
+                    'left': None, 'right': None}
+
+        return {
+            'center': center,
+            'by_start': sorted(overlapping, key=lambda interval: interval[0]),
+            'by_end': sorted(overlapping, key=lambda interval: -interval[1]),
+            'left': self._build(left),
+            'right': self._build(right),
+        }
+
+    def query(self, price: float) -> Set[int]:
+        """Return ids of every interval containing `price`."""
+        matched = set()
+        node = self._root
+        while node:
+            if 'scan' in node:
+                matched.update(rule_id for start, end, rule_id in node['scan'] if start <= price <= end)
+                break
+            if price < node['center']:
+                for start, _, rule_id in node['by_start']:
+                    if start > price:
+                        break
+                    matched.add(rule_id)
+                node = node['left']
+            elif price > node['center']:
+                for _, end, rule_id in node['by_end']:
+                    if end < price:
+                        break
+                    matched.add(rule_id)
+                node = node['right']
+            else:
+                matched.update(rule_id for _, _, rule_id in node['by_start'])
+                break
+        return matched
+
+class WatchRuleEngine:
+    """Compiled set of watch rules matched against processed posts.
+
+    A rule matches when every criterion it sets holds: any of its keywords
+    appears in the title or description, the price is within its range, and
+    the size and colour are among those listed. Each criterion has its own
+    index, and a rule matches when it is hit by all the criteria it uses.
+    """
+
+    def __init__(self, rules: Iterable[Dict]):
+        keywords = {}
+        sizes = {}
+        colors = {}
+        intervals = []
+        self.required = {}
+        self.names = {}
+
+        for rule in rules:
+            rule_id = rule['id']
+            criteria = 0
+
+            rule_keywords = [keyword.strip().lower() for keyword in _load_list(rule.get('keywords')) if keyword.strip()]
+            if rule_keywords:
+                criteria += 1
+                for keyword in rule_keywords:
+                    keywords.setdefault(keyword, set()).add(rule_id)
+
+            if rule.get('min_price') is not None or rule.get('max_price') is not None:
+                criteria += 1
+                low = rule['min_price'] if rule.get('min_price') is not None else float('-inf')
+                high = rule['max_price'] if rule.get('max_price') is not None else float('inf')
+                intervals.append((low, high, rule_id))
+
+            for field, index in (('sizes', sizes), ('colors', colors)):
+                values = [value.strip().lower() for value in _load_list(rule.get(field)) if value.strip()]
+                if values:
+                    criteria += 1
+                    for value in values:
+                        index.setdefault(value, set()).add(rule_id)
+
+            if criteria:
+                self.required[rule_id] = criteria
+                self.names[rule_id] = rule.get('name', str(rule_id))
+
+        self._keywords = KeywordAutomaton(keywords) if keywords else None
+        self._prices = PriceIntervalIndex(intervals) if intervals else None
+        self._sizes = sizes
+        self._colors = colors
+
+    def __len__(self) -> int:
+        return len(self.required)
+
+    def match(self, post: Dict) -> List[int]:
+        """Return the ids of rules matching a post from `TiseScraper._process_api_post`."""
+        if not self.required:
+            return []
+
+        hits = Counter()
+        if self._keywords:
+            text = f"{post.get('title') or ''}\n{post.get('description') or ''}".lower()
+            hits.update(self._keywords.match(text))
+
+        if self._prices and post.get('price_nok') is not None:
+            hits.update(self._prices.query(post['price_nok']))
+
+        if self._sizes and post.get('size'):
+            hits.update(self._sizes.get(str(post['size']).strip().lower(), ()))
+
+        if self._colors and post.get('colors'):
+            color_hits = set()
+            for color in str(post['colors']).split(','):
+                color_hits |= self._colors.get(color.strip().lower(), set())
+            hits.update(color_hits)
+
+        return [rule_id for rule_id, count in hits.items() if count == self.required[rule_id]]
+
+def _load_list(value) -> List[str]:
+    """Accept a JSON list, comma-separated string or list for a rule field."""
+    if not value:
+        return []
+    if isinstance(value, list):
+        return value
+    try:
+        loaded = json.loads(value)
+        if isinstance(loaded, list):
+            return [str(item) for item in loaded]
+    except (TypeError, ValueError):
+        pass
+    return str(value).split(',')